@@ -0,0 +1,19 @@
+-- Expiração de convites (expiracao.py) num banco MySQL já existente.
+--
+-- O db.create_all() só cria tabelas que faltam, não altera as que já
+-- existem: sem isto o UPDATE para 'expirado' falha com "Data truncated" no
+-- modo estrito e a varredura por (status, create_time, id) fica sem índice.
+--
+-- Uso: mysql -u admin -p makequestions < migrations/001_expiracao_convites.sql
+
+ALTER TABLE convite_professor
+    MODIFY status ENUM('pendente', 'aceito', 'recusado', 'expirado') NOT NULL DEFAULT 'pendente';
+
+ALTER TABLE convite_aluno
+    MODIFY status ENUM('pendente', 'aceito', 'recusado', 'expirado') NOT NULL DEFAULT 'pendente';
+
+ALTER TABLE mensagem
+    MODIFY status ENUM('enviado', 'lido', 'respondido', 'expirado') NOT NULL DEFAULT 'enviado';
+
+CREATE INDEX ix_convite_professor_status_create_time ON convite_professor (status, create_time, id);
+CREATE INDEX ix_convite_aluno_status_create_time ON convite_aluno (status, create_time, id);
@@ -0,0 +1,21 @@
+-- Coluna update_time nas tabelas que mudam depois de criadas, usada como
+-- watermark da exportação incremental (exportacao.py). Sem ela, mudanças
+-- de status (lido, respondido, aceito, recusado, expirado) não saem de novo.
+--
+-- Uso: mysql -u admin -p makequestions < migrations/002_update_time_exportacao.sql
+
+ALTER TABLE mensagem ADD COLUMN update_time DATETIME NULL AFTER create_time;
+UPDATE mensagem SET update_time = GREATEST(create_time, COALESCE(data_resposta, create_time));
+ALTER TABLE mensagem MODIFY update_time DATETIME NOT NULL;
+
+ALTER TABLE convite_professor ADD COLUMN update_time DATETIME NULL AFTER create_time;
+UPDATE convite_professor SET update_time = GREATEST(create_time, COALESCE(data_resposta, create_time));
+ALTER TABLE convite_professor MODIFY update_time DATETIME NOT NULL;
+
+ALTER TABLE convite_aluno ADD COLUMN update_time DATETIME NULL AFTER create_time;
+UPDATE convite_aluno SET update_time = GREATEST(create_time, COALESCE(data_resposta, create_time));
+ALTER TABLE convite_aluno MODIFY update_time DATETIME NOT NULL;
+
+ALTER TABLE turmas ADD COLUMN update_time DATETIME NULL AFTER create_time;
+UPDATE turmas SET update_time = create_time;
+ALTER TABLE turmas MODIFY update_time DATETIME NOT NULL;
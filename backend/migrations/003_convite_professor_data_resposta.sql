@@ -0,0 +1,7 @@
+-- convite_professor.data_resposta passa a aceitar NULL (fica vazia até o
+-- convite ser respondido, como em convite_aluno). Sem isto, criar um
+-- convite num banco MySQL já existente falha.
+--
+-- Uso: mysql -u admin -p makequestions < migrations/003_convite_professor_data_resposta.sql
+
+ALTER TABLE convite_professor MODIFY data_resposta DATETIME NULL;
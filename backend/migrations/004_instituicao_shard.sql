@@ -0,0 +1,16 @@
+-- Diretório global de instituições usado pelo sharding (ver src/sharding.py):
+-- reserva o id de cada instituição entre todos os bancos. As instituições
+-- que já existem no banco padrão entram no diretório com os ids delas, para
+-- que as novas não repitam esses ids num shard.
+--
+-- Uso: mysql -u admin -p makequestions < migrations/004_instituicao_shard.sql
+
+CREATE TABLE IF NOT EXISTS instituicao_shard (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    shard VARCHAR(64) NULL,
+    create_time DATETIME NULL,
+    PRIMARY KEY (id)
+);
+
+INSERT IGNORE INTO instituicao_shard (id, shard, create_time)
+SELECT id, NULL, create_time FROM instituicao;
@@ -0,0 +1,9 @@
+-- curso.create_time passa a ser NOT NULL. A listagem paginada de cursos
+-- ordena por (create_time, id) com keyset: um NULL virava null no cursor
+-- (400 na página seguinte) e a comparação pulava essas linhas. Cursos sem
+-- data ficam com o update_time, ou com a hora da migração.
+--
+-- Uso: mysql -u admin -p makequestions < migrations/005_curso_create_time.sql
+
+UPDATE curso SET create_time = COALESCE(update_time, NOW()) WHERE create_time IS NULL;
+ALTER TABLE curso MODIFY create_time DATETIME NOT NULL;
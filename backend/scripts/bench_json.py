@@ -0,0 +1,82 @@
+# Benchmark do encode JSON e dos bytes trafegados, antes (jsonify padrão,
+# sem compressão) e depois (FastJSONProvider + gzip/brotli).
+#
+# Uso: python scripts/bench_json.py [quantidade_de_usuarios]
+import base64
+import gzip
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from json_provider import FastJSONProvider, orjson
+from compressao import brotli
+
+REPETICOES = 20
+
+
+# Monta um payload parecido com o do /getall, com as imagens em base64
+def montar_payload(quantidade):
+    agora = datetime(2024, 1, 1)
+    imagem = base64.b64encode(os.urandom(4096)).decode('ascii')
+    usuarios = []
+    for i in range(quantidade):
+        usuarios.append({
+            'id': i,
+            'nome': f'Usuario {i}',
+            'sobrenome': 'Silva',
+            'email': f'usuario{i}@exemplo.com',
+            'telefone': '(11) 99999-0000',
+            'image': imagem if i % 4 == 0 else None,
+            'img_link': '/assets/user-no_image.png',
+            'tipo': 'aluno',
+            'genero': 'outro',
+            'nascimento': '2000-01-01',
+            'create_time': (agora + timedelta(minutes=i)).isoformat(),
+            'update_time': (agora + timedelta(minutes=i)).isoformat(),
+            'confirmed': True,
+            'mensagens_recebidas': [
+                {'id': i * 10 + j, 'status': 'enviado', 'tipo': 'convite', 'text': None,
+                 'create_time': agora.isoformat()} for j in range(5)
+            ],
+        })
+    return {'usuarios': usuarios}
+
+
+def medir(func):
+    inicio = time.perf_counter()
+    for _ in range(REPETICOES):
+        resultado = func()
+    return (time.perf_counter() - inicio) / REPETICOES * 1000, resultado
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payload = montar_payload(quantidade)
+    app = Flask(__name__)
+    # O caminho que o app usava antes: o provider padrão do Flask (sort_keys,
+    # ensure_ascii e separadores compactos fora do modo debug)
+    padrao = DefaultJSONProvider(app)
+    provider = FastJSONProvider(app)
+
+    ms_antes, antes = medir(lambda: padrao.response(payload).get_data())
+    ms_depois, depois = medir(lambda: provider.response(payload).get_data())
+
+    print(f'usuarios: {quantidade}  (orjson: {"sim" if orjson else "não"}, brotli: {"sim" if brotli else "não"})')
+    print(f'{"":24}{"encode (ms)":>14}{"bytes":>14}')
+    print(f'{"antes (provider padrão)":24}{ms_antes:14.2f}{len(antes):14d}')
+    print(f'{"depois (provider)":24}{ms_depois:14.2f}{len(depois):14d}')
+
+    ms_gzip, comprimido = medir(lambda: gzip.compress(depois, compresslevel=6))
+    print(f'{"depois + gzip":24}{ms_depois + ms_gzip:14.2f}{len(comprimido):14d}')
+    if brotli is not None:
+        ms_br, comprimido = medir(lambda: brotli.compress(depois, quality=4))
+        print(f'{"depois + br":24}{ms_depois + ms_br:14.2f}{len(comprimido):14d}')
+
+
+if __name__ == '__main__':
+    main()
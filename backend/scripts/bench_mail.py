@@ -0,0 +1,78 @@
+# Mede o throughput (envios/s) da fila de emails contra um servidor SMTP
+# local (aiosmtpd, em requirements-dev.txt) e um banco SQLite temporário.
+# Também conta envios duplicados entre workers.
+#
+# Uso: python scripts/bench_mail.py [quantidade] [workers]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aiosmtpd.controller import Controller
+
+from app import create_app
+from config import Config
+from mail_worker import MailWorker
+from models import db, EmailFila
+
+PORTA_SMTP = 8025
+
+
+class ContadorHandler:
+    def __init__(self):
+        self.recebidos = 0
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.recebidos += 1
+        return '250 OK'
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    banco = os.path.join(tempfile.mkdtemp(), 'bench_mail.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{banco}'
+        MAIL_SERVER = 'localhost'
+        MAIL_PORT = PORTA_SMTP
+        MAIL_USE_TLS = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        MAIL_INTERVALO = 0.1
+
+    handler = ContadorHandler()
+    controller = Controller(handler, hostname='localhost', port=PORTA_SMTP)
+    controller.start()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(EmailFila.__table__.insert(), [
+            {'destinatario': f'professor{i}@exemplo.com', 'assunto': 'Convite', 'corpo': 'Corpo do convite'}
+            for i in range(quantidade)
+        ])
+        db.session.commit()
+
+        inicio = time.perf_counter()
+        worker = MailWorker(app, workers).start()
+        while handler.recebidos < quantidade:
+            time.sleep(0.01)
+        duracao = time.perf_counter() - inicio
+        worker.stop()
+        controller.stop()
+
+        falhas = db.session.query(EmailFila).filter(EmailFila.status != 'enviado').count()
+
+    print(f'emails: {quantidade}  workers: {workers}  lote: {BenchConfig.MAIL_LOTE}')
+    duplicados = handler.recebidos - (quantidade - falhas)
+    print(f'tempo: {duracao:.2f} s  envios/s: {quantidade / duracao:.1f}  não enviados: {falhas}  duplicados: {duplicados}')
+
+
+if __name__ == '__main__':
+    main()
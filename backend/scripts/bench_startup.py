@@ -0,0 +1,82 @@
+# Benchmark de cold start do backend: roda `python -X importtime` criando o
+# app pela factory, mostra os imports mais caros e compara o tempo total de
+# boot com a meta.
+#
+# Uso: python scripts/bench_startup.py [--top N] [--target-ms MS]
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Meta de boot do processo (import + create_app), em milissegundos
+BOOT_TARGET_MS = 600
+
+# Módulos que não deveriam ser carregados no boot
+IMPORTS_PREGUICOSOS = ('google.oauth2', 'google.auth', 'marshmallow', 'marshmallow_sqlalchemy', 'schemas')
+
+CODIGO = 'from app import create_app; create_app()'
+
+
+# Cada linha do -X importtime tem o formato:
+#   import time: self [us] | cumulative | imported package
+def parse_importtime(saida):
+    imports = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'imported package' in linha:
+            continue
+        _, resto = linha.split(':', 1)
+        proprio, cumulativo, nome = resto.split('|', 2)
+        profundidade = (len(nome) - len(nome.lstrip())) // 2
+        imports.append({
+            'modulo': nome.strip(),
+            'self_us': int(proprio),
+            'cumulative_us': int(cumulativo),
+            'nivel': profundidade,
+        })
+    return imports
+
+
+def medir_boot():
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO],
+        cwd=SRC, capture_output=True, text=True,
+    )
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    if processo.returncode != 0:
+        sys.stderr.write(processo.stderr)
+        raise SystemExit('Falha ao criar o app')
+    return duracao_ms, parse_importtime(processo.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--target-ms', type=float, default=float(os.getenv('BOOT_TARGET_MS', BOOT_TARGET_MS)))
+    args = parser.parse_args()
+
+    duracao_ms, imports = medir_boot()
+    raizes = [i for i in imports if i['nivel'] == 1]
+    total_import_ms = sum(i['self_us'] for i in imports) / 1000
+
+    print(f'{"cumulativo (ms)":>16}{"próprio (ms)":>14}  módulo')
+    for item in sorted(raizes, key=lambda i: i['cumulative_us'], reverse=True)[:args.top]:
+        print(f'{item["cumulative_us"] / 1000:16.1f}{item["self_us"] / 1000:14.1f}  {item["modulo"]}')
+
+    carregados = sorted({i['modulo'] for i in imports if i['modulo'].startswith(IMPORTS_PREGUICOSOS)})
+    print()
+    print(f'módulos importados: {len(imports)}')
+    print(f'tempo de import:    {total_import_ms:.1f} ms')
+    print(f'boot do processo:   {duracao_ms:.1f} ms (meta {args.target_ms:.0f} ms)')
+    if carregados:
+        print(f'imports que deveriam ser preguiçosos: {", ".join(carregados)}')
+
+    if duracao_ms > args.target_ms or carregados:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
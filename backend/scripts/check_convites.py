@@ -0,0 +1,152 @@
+# Verifica as transições de convite sob concorrência: 16 threads aceitam e
+# recusam o mesmo convite ao mesmo tempo pelo PUT /convite. Cada convite
+# tem que ter exatamente uma resposta 200, nenhum 500, um único vínculo
+# professor_unidade quando aceito e as mensagens marcadas como respondidas.
+# Também confere o aceite de convites de aluno feitos só pelo email.
+#
+# Uso: python scripts/check_convites.py [convites] [threads]
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select
+
+from app import create_app
+from config import Config
+from models import (db, Usuario, Instituicao, Unidade, Professor, Turma, TurmaAluno, ConviteProfessor, ConviteAluno,
+                    Convite, Mensagem, ProfessorUnidade)
+
+
+def popular(quantidade):
+    usuario = Usuario(nome='Inst', email='instituicao@exemplo.com', senha='senha', tipo='instituicao', confirmed=True)
+    db.session.add(usuario)
+    db.session.flush()
+    instituicao = Instituicao(id_usuario=usuario.id, nome='Instituição', confirmed=True)
+    db.session.add(instituicao)
+    db.session.flush()
+    unidade = Unidade(id_instituicao=instituicao.id, nome='Unidade', confirmed=True)
+    db.session.add(unidade)
+    db.session.flush()
+
+    convites = []
+    for i in range(quantidade):
+        professor_usuario = Usuario(nome=f'Prof{i}', email=f'professor{i}@exemplo.com', senha='senha',
+                                    tipo='professor', confirmed=True)
+        db.session.add(professor_usuario)
+        db.session.flush()
+        professor = db.session.execute(select(Professor).where(Professor.id_usuario == professor_usuario.id)).scalar_one()
+        convite = ConviteProfessor(id_unidade=unidade.id, id_professor=professor.id, email_professor=professor_usuario.email)
+        db.session.add(convite)
+        db.session.flush()
+        convites.append((convite.id, professor_usuario.id))
+    db.session.commit()
+    return convites
+
+
+def disputar(app, convite_id, token, threads):
+    barreira = threading.Barrier(threads)
+    respostas = []
+    lock = threading.Lock()
+
+    def responder():
+        modo = random.choice(('aceitar', 'recusar'))
+        cliente = app.test_client()
+        barreira.wait()
+        resposta = cliente.put('/convite', headers={'Authorization': f'Bearer {token}'},
+                               json={'mode': modo, 'convite': {'convite': {'convite_professor': {'id': convite_id}}}})
+        with lock:
+            respostas.append((modo, resposta.status_code))
+
+    workers = [threading.Thread(target=responder) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return respostas
+
+
+def conferir_convite(convite_id, respostas):
+    codigos = Counter(codigo for _, codigo in respostas)
+    assert codigos[200] == 1 and codigos[400] == len(respostas) - 1, f'convite {convite_id}: {dict(codigos)}'
+
+    vencedor = next(modo for modo, codigo in respostas if codigo == 200)
+    convite = db.session.get(ConviteProfessor, convite_id)
+    assert convite.status == {'aceitar': 'aceito', 'recusar': 'recusado'}[vencedor], convite.status
+
+    vinculos = db.session.execute(
+        select(func.count()).select_from(ProfessorUnidade)
+        .where(ProfessorUnidade.id_professor == convite.id_professor, ProfessorUnidade.id_unidade == convite.id_unidade)
+    ).scalar()
+    assert vinculos == (1 if vencedor == 'aceitar' else 0), f'convite {convite_id}: {vinculos} vínculo(s)'
+
+    status = db.session.execute(
+        select(Mensagem.status).join(Convite, Convite.id == Mensagem.id_convite)
+        .where(Convite.id_convite_professor == convite_id)
+    ).scalars().all()
+    assert status and set(status) == {'respondido'}, f'convite {convite_id}: mensagens {status}'
+    return vencedor
+
+
+# Convite de aluno feito só pelo email: aceitar vincula o aluno com esse
+# email; sem aluno cadastrado o convite fica pendente
+def conferir_convite_aluno():
+    professor = db.session.execute(select(Professor)).scalars().first()
+    turma = Turma(nome='Turma', id_professor=professor.id)
+    aluno = Usuario(nome='Aluno', email='aluno@exemplo.com', senha='senha', tipo='aluno', confirmed=True)
+    db.session.add_all([turma, aluno])
+    db.session.flush()
+    com_aluno = ConviteAluno(id_turma=turma.id, email_aluno='aluno@exemplo.com')
+    sem_aluno = ConviteAluno(id_turma=turma.id, email_aluno='ninguem@exemplo.com')
+    db.session.add_all([com_aluno, sem_aluno])
+    db.session.commit()
+
+    assert ConviteAluno.aceitar(com_aluno.id)
+    assert not ConviteAluno.aceitar(sem_aluno.id)
+    db.session.commit()
+
+    matriculas = db.session.execute(select(func.count()).select_from(TurmaAluno).where(TurmaAluno.id_turma == turma.id)).scalar()
+    assert matriculas == 1, f'{matriculas} matrícula(s)'
+    assert ConviteAluno.status_atual(com_aluno.id) == 'aceito'
+    assert ConviteAluno.status_atual(sem_aluno.id) == 'pendente'
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    banco = os.path.join(tempfile.mkdtemp(), 'check_convites.db')
+
+    class ConvitesConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{banco}'
+        # Escritas concorrentes no SQLite esperam o lock em vez de falhar
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+        JWT_VERIFY_SUB = False
+        RATE_LIMIT_ENABLED = False
+        EXPIRACAO_AGENDADA = False
+
+    app = create_app(ConvitesConfig)
+    app.config['JWT_SECRET_KEY'] = app.config['JWT_SECRET_KEY'] or 'check-convites'
+    with app.app_context():
+        db.create_all()
+        convites = popular(quantidade)
+        tokens = {id_usuario: create_access_token(identity=id_usuario) for _, id_usuario in convites}
+
+    vencedores = Counter()
+    for convite_id, id_usuario in convites:
+        respostas = disputar(app, convite_id, tokens[id_usuario], threads)
+        with app.app_context():
+            vencedores[conferir_convite(convite_id, respostas)] += 1
+    print(f'ok  {quantidade} convite(s) x {threads} threads: {dict(vencedores)}, uma resposta 200 por convite')
+
+    with app.app_context():
+        conferir_convite_aluno()
+    print('ok  convite de aluno pelo email')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# Verifica o roteamento entre shards com vários bancos SQLite locais: o
+# banco padrão e dois shards, com usuários de mesmo id em bancos diferentes.
+# Cada usuário só pode enxergar a si mesmo, e tokens sem um shard válido são
+# recusados. Também cria uma instituição mapeada para um shard e convida um
+# professor cadastrado no banco padrão: os dois vão para o shard. As
+# leituras do buffer write-behind são gravadas no shard de quem leu, e a
+# exportação e a expiração de convites passam por todos os bancos.
+#
+# Uso: python scripts/check_sharding.py
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from flask import g
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import create_app
+from config import Config
+from mail_worker import processar_filas
+from escritas import buffer_leituras
+from expiracao import expirar_convites
+from exportacao import exportar
+from models import db, ConviteProfessor, EmailFila, Mensagem, Professor, Usuario
+
+SHARDS = ['shard_a', 'shard_b']
+
+# (shard, nome, email); o primeiro usuário de cada banco fica com o id 1
+USUARIOS = [
+    (None, 'Padrao', 'padrao@exemplo.com'),
+    ('shard_a', 'AlunoA', 'aluno_a@exemplo.com'),
+    ('shard_b', 'AlunoB', 'aluno_b@exemplo.com'),
+]
+
+
+def popular(app):
+    with app.app_context():
+        db.create_all()
+        for shard in SHARDS:
+            db.metadata.create_all(db.engines[shard])
+
+        for shard, nome, email in USUARIOS:
+            g.shard = shard
+            db.session.add(Usuario(nome=nome, email=email, senha='senha', tipo='aluno', confirmed=True))
+            db.session.commit()
+            db.session.remove()
+
+
+def entrar(cliente, email):
+    resposta = cliente.post('/login', json={'email': email, 'senha': 'senha'})
+    assert resposta.status_code == 200, resposta.get_json()
+    return {'Authorization': f'Bearer {resposta.get_json()["access_token"]}'}
+
+
+def main():
+    pasta = tempfile.mkdtemp()
+
+    class ShardingConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(pasta, "padrao.db")}'
+        SHARDS = {shard: f'sqlite:///{os.path.join(pasta, shard + ".db")}' for shard in SHARDS}
+        # A primeira instituição criada (id 1) vai para o shard_b; a segunda fica no padrão
+        SHARD_MAP = {1: 'shard_b'}
+        MAIL_SUPPRESS_SEND = True
+        WRITE_BEHIND_LEITURAS = True
+        WRITE_BEHIND_DIR = os.path.join(pasta, 'write-behind')
+        WRITE_BEHIND_INTERVALO = 3600  # o script descarrega o buffer na mão
+        JWT_VERIFY_SUB = False
+        RATE_LIMIT_ENABLED = False
+        EXPIRACAO_AGENDADA = False
+
+    app = create_app(ShardingConfig)
+    app.config['JWT_SECRET_KEY'] = app.config['JWT_SECRET_KEY'] or 'check-sharding'
+    popular(app)
+    cliente = app.test_client()
+
+    # Cada usuário enxerga a si mesmo, mesmo com o id 1 repetido nos bancos
+    for shard, nome, email in USUARIOS:
+        resposta = cliente.get('/usuarios', headers=entrar(cliente, email))
+        assert resposta.status_code == 200, resposta.get_json()
+        usuario = resposta.get_json()['usuario']
+        assert (usuario['id'], usuario['email']) == (1, email), f'{email} ({shard}) recebeu {usuario}'
+        print(f'ok  {email} -> {shard or "padrão"}')
+
+    # Tokens sem o claim ou com um shard desconhecido não caem no banco padrão
+    with app.app_context():
+        tokens = {
+            'sem claim': create_access_token(identity=1),
+            'shard desconhecido': create_access_token(identity=1, additional_claims={'shard': 'shard_x'}),
+        }
+    for caso, token in tokens.items():
+        resposta = cliente.get('/usuarios', headers={'Authorization': f'Bearer {token}'})
+        assert resposta.status_code == 401, f'{caso}: {resposta.status_code} {resposta.get_json()}'
+        print(f'ok  token {caso} recusado')
+
+    # O /getall junta os usuários de todos os bancos; o campo shard separa os ids repetidos
+    usuarios = sorted((u['shard'] or '', u['id'], u['email']) for u in cliente.get('/getall').get_json()['usuarios'])
+    assert usuarios == sorted((shard or '', 1, email) for shard, _, email in USUARIOS), usuarios
+    print(f'ok  /getall com {len(usuarios)} usuários de {len(SHARDS) + 1} bancos, cada um com seu shard')
+
+    conferir_leituras(app, cliente)
+    conferir_instituicao(app, cliente)
+    conferir_exportacao(app, os.path.join(pasta, 'exportacao'))
+    conferir_expiracao(app)
+
+
+# Um convite vencido no shard_b é expirado pela varredura de todos os bancos
+def conferir_expiracao(app):
+    with app.app_context():
+        g.shard = 'shard_b'
+        professor = db.session.execute(db.select(Professor)).scalars().first()
+        convite = ConviteProfessor(id_unidade=1, id_professor=professor.id, email_professor='prof@exemplo.com',
+                                   create_time=datetime.utcnow() - timedelta(days=60))
+        db.session.add(convite)
+        db.session.commit()
+        id_convite = convite.id
+        db.session.remove()
+
+        resultado = expirar_convites(timedelta(days=30))
+        assert (resultado['convite_professor'], resultado['bancos']) == (1, len(SHARDS) + 1), resultado
+        g.shard = 'shard_b'
+        assert ConviteProfessor.status_atual(id_convite) == 'expirado'
+    print(f'ok  convite vencido do shard_b expirado na varredura de {resultado["bancos"]} bancos')
+
+
+# Cada banco é exportado com os próprios watermarks: a segunda execução não
+# repete nenhum usuário
+def conferir_exportacao(app, destino):
+    with app.app_context():
+        primeira = exportar(destino)
+        segunda = exportar(destino)
+    usuarios = {chave: linhas for chave, linhas in primeira.items() if chave.endswith('usuarios')}
+    assert usuarios == {'usuarios': 2, 'shard_a/usuarios': 1, 'shard_b/usuarios': 3}, usuarios
+    assert all(linhas == 0 for chave, linhas in segunda.items() if chave.endswith('usuarios')), segunda
+    for shard in SHARDS:
+        assert os.path.exists(os.path.join(destino, 'shards', shard, '_watermarks.json')), shard
+    print(f'ok  exportação de {len(SHARDS) + 1} bancos, watermarks por shard')
+
+
+# A mensagem 1 existe no banco padrão e no shard_b; a leitura do aluno do
+# shard_b só pode mudar a do shard_b
+def conferir_leituras(app, cliente):
+    with app.app_context():
+        for shard in (None, 'shard_b'):
+            g.shard = shard
+            db.session.add(Mensagem(id_remetente=1, id_destinatario=1, tipo='msg', text='oi'))
+            db.session.commit()
+            db.session.remove()
+
+    headers = entrar(cliente, 'aluno_b@exemplo.com')
+    resposta = cliente.put('/msg/status', headers=headers, json={'msg': 'abc', 'status': 'lido'})
+    assert resposta.status_code == 400, resposta.get_json()
+    resposta = cliente.put('/msg/status', headers=headers, json={'msg': 1, 'status': 'lido'})
+    assert resposta.status_code == 202, resposta.get_json()
+
+    with app.app_context():
+        assert buffer_leituras().descarregar() == 1
+        status = {}
+        for shard in (None, 'shard_b'):
+            g.shard = shard
+            status[shard] = db.session.get(Mensagem, 1).status
+            db.session.remove()
+    assert status == {None: 'enviado', 'shard_b': 'lido'}, status
+    print('ok  leitura do buffer gravada só no shard_b; id inválido recusado com 400')
+
+
+def cadastrar(cliente, nome, email, tipo):
+    resposta = cliente.post('/usuarios', json={'method': 'Cadastrando um novo usuário!', 'user': {
+        'nome': nome, 'email': email, 'senha': 'senha', 'tipo': tipo}})
+    assert resposta.status_code == 201, resposta.get_json()
+
+
+def shard_do_token(app, headers):
+    with app.app_context():
+        return decode_token(headers['Authorization'].split()[1])['shard']
+
+
+# Instituição no shard do SHARD_MAP: o dono e o professor convidado saem do
+# banco padrão e vão para o shard; quem já tem dados não muda de banco
+def conferir_instituicao(app, cliente):
+    cadastrar(cliente, 'InstB', 'inst_b@exemplo.com', 'instituicao')
+    cadastrar(cliente, 'InstPadrao', 'inst_padrao@exemplo.com', 'instituicao')
+    cadastrar(cliente, 'Prof', 'prof@exemplo.com', 'professor')
+
+    antigo = entrar(cliente, 'inst_b@exemplo.com')
+    resposta = cliente.post('/instituicao', headers=antigo, json={'instituicao': 'Instituição B'})
+    assert resposta.status_code == 201, resposta.get_json()
+    assert resposta.get_json()['instituicao']['id'] == 1, resposta.get_json()
+    headers = {'Authorization': f'Bearer {resposta.get_json()["token"]}'}
+    assert shard_do_token(app, headers) == 'shard_b'
+    assert shard_do_token(app, entrar(cliente, 'inst_b@exemplo.com')) == 'shard_b'
+    assert cliente.get('/usuarios', headers=antigo).status_code == 404
+    assert cliente.get('/usuarios', headers=headers).get_json()['instituicao']['id'] == 1
+    print('ok  instituição 1 e o dono no shard_b, token antigo recusado')
+
+    resposta = cliente.post('/instituicao/unidade', headers=headers, json={'unidade': {'nome_unidade': 'Unidade B'}})
+    assert resposta.status_code == 201, resposta.get_json()
+    id_unidade = resposta.get_json()['unidade']['id']
+    resposta = cliente.post('/convite', headers=headers,
+                            json={'convite': {'email_professor': 'prof@exemplo.com', 'id_unidade': id_unidade}})
+    assert resposta.status_code == 201, resposta.get_json()
+    id_convite = resposta.get_json()['convite']['id']
+
+    professor = entrar(cliente, 'prof@exemplo.com')
+    assert shard_do_token(app, professor) == 'shard_b'
+    resposta = cliente.put('/convite', headers=professor,
+                           json={'mode': 'aceitar', 'convite': {'convite': {'convite_professor': {'id': id_convite}}}})
+    assert resposta.status_code == 200, resposta.get_json()
+    print('ok  professor do banco padrão convidado, movido para o shard_b e aceitou')
+
+    # O email do convite fica na fila do shard_b e o worker passa por ela
+    with app.app_context():
+        assert processar_filas() == 1
+        g.shard = 'shard_b'
+        status = db.session.execute(db.select(EmailFila.status)).scalars().all()
+        assert status == ['enviado'], status
+    print('ok  email do convite enviado a partir da fila do shard_b')
+
+    # A segunda instituição fica no banco padrão; o professor já tem vínculo no shard_b
+    outra = entrar(cliente, 'inst_padrao@exemplo.com')
+    resposta = cliente.post('/instituicao', headers=outra, json={'instituicao': 'Instituição Padrão'})
+    assert resposta.status_code == 201, resposta.get_json()
+    assert resposta.get_json()['instituicao']['id'] == 2, resposta.get_json()
+    outra = {'Authorization': f'Bearer {resposta.get_json()["token"]}'}
+    assert shard_do_token(app, outra) is None
+    resposta = cliente.post('/instituicao/unidade', headers=outra, json={'unidade': {'nome_unidade': 'Unidade P'}})
+    resposta = cliente.post('/convite', headers=outra, json={'convite': {
+        'email_professor': 'prof@exemplo.com', 'id_unidade': resposta.get_json()['unidade']['id']}})
+    assert resposta.status_code == 409, resposta.get_json()
+    print('ok  instituição 2 no banco padrão, convite ao professor do shard_b recusado com 409')
+
+    # Quem mudou de banco não fica duplicado no banco padrão
+    emails = [u['email'] for u in cliente.get('/getall').get_json()['usuarios']]
+    assert len(emails) == len(set(emails)) == len(USUARIOS) + 3, emails
+    print(f'ok  /getall com {len(emails)} usuários, nenhum duplicado')
+
+
+if __name__ == '__main__':
+    main()
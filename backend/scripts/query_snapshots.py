@@ -0,0 +1,292 @@
+# Regressão de queries das rotas da API.
+#
+# Sobe o app contra um banco SQLite temporário (ou --database-url), popula
+# dados fixos, chama cada rota e grava o SQL emitido, normalizado, em
+# query_snapshots/<rota>.json junto com o plano de cada SELECT e uma
+# estimativa de linhas lidas. Sem --update, compara com os snapshots e
+# termina com erro quando uma rota passa a emitir mais statements ou a ler
+# mais linhas do que a tolerância, mostrando o diff das queries. Rotas que
+# respondem 5xx nunca viram snapshot.
+#
+# Uso: python scripts/query_snapshots.py [--update] [--rota NOME] [--database-url URL]
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func, select
+
+from app import create_app
+from config import Config
+from models import (db, Usuario, Instituicao, Unidade, Curso, Turma, TurmaAluno, ConviteProfessor, Mensagem,
+                    Professor, Aluno)
+
+PASTA_SNAPSHOTS = os.path.join(os.path.dirname(__file__), '..', 'query_snapshots')
+
+# Quanto uma rota pode crescer antes de falhar
+TOLERANCIA_STATEMENTS = 0
+TOLERANCIA_LINHAS = 0.5  # 50% a mais na estimativa de linhas lidas
+
+QUANTIDADE_ALUNOS = 20
+QUANTIDADE_CURSOS = 10
+
+
+def popular():
+    instituicao_usuario = Usuario(nome='Inst', email='instituicao@exemplo.com', senha='senha', tipo='instituicao', confirmed=True)
+    db.session.add(instituicao_usuario)
+    db.session.flush()
+    instituicao = Instituicao(id_usuario=instituicao_usuario.id, nome='Instituição', confirmed=True)
+    db.session.add(instituicao)
+    db.session.flush()
+    unidade = Unidade(id_instituicao=instituicao.id, nome='Unidade', confirmed=True)
+    db.session.add(unidade)
+
+    professores = []
+    for i in range(3):
+        usuario = Usuario(nome=f'Prof{i}', email=f'professor{i}@exemplo.com', senha='senha', tipo='professor', confirmed=True)
+        db.session.add(usuario)
+        db.session.flush()
+        professores.append(db.session.execute(select(Professor).where(Professor.id_usuario == usuario.id)).scalar_one())
+
+    turma = Turma(nome='Turma', id_professor=professores[0].id)
+    db.session.add(turma)
+    db.session.flush()
+
+    for i in range(QUANTIDADE_ALUNOS):
+        usuario = Usuario(nome=f'Aluno{i:02d}', email=f'aluno{i}@exemplo.com', senha='senha', tipo='aluno', confirmed=True)
+        db.session.add(usuario)
+        db.session.flush()
+        aluno = db.session.execute(select(Aluno).where(Aluno.id_usuario == usuario.id)).scalar_one()
+        db.session.add(TurmaAluno(id_turma=turma.id, id_aluno=aluno.id))
+
+    for i in range(QUANTIDADE_CURSOS):
+        db.session.add(Curso(nome=f'Curso{i:02d}', id_unidade=unidade.id, id_professor=professores[i % 3].id, confirmed=True))
+
+    # Convites disparam os listeners (convite, mensagem e fila de email)
+    for professor in professores:
+        db.session.add(ConviteProfessor(id_unidade=unidade.id, id_professor=professor.id, email_professor=professor.usuario.email))
+    db.session.commit()
+
+    return {
+        'instituicao': instituicao_usuario.id,
+        'professor': professores[0].id_usuario,
+        'aluno': db.session.execute(select(Usuario.id).where(Usuario.email == 'aluno0@exemplo.com')).scalar_one(),
+        'turma': turma.id,
+        'unidade': unidade.id,
+        'convite': db.session.execute(select(ConviteProfessor.id).order_by(ConviteProfessor.id)).scalars().first(),
+        # Mensagem de outro convite: a do primeiro vira 'respondido' no aceite
+        'mensagem': db.session.execute(select(Mensagem.id).order_by(Mensagem.id.desc())).scalars().first(),
+    }
+
+
+# (nome, usuário do token, método, caminho, corpo)
+def rotas(ids):
+    return [
+        ('login', None, 'POST', '/login', {'email': 'professor0@exemplo.com', 'senha': 'senha'}),
+        ('usuarios_aluno', 'aluno', 'GET', '/usuarios', None),
+        ('usuarios_professor', 'professor', 'GET', '/usuarios', None),
+        ('usuarios_instituicao', 'instituicao', 'GET', '/usuarios', None),
+        ('convite_aceitar', 'professor', 'PUT', '/convite',
+         {'mode': 'aceitar', 'convite': {'convite': {'convite_professor': {'id': ids['convite']}}}}),
+        ('msg_lida', 'professor', 'PUT', '/msg/status', {'msg': ids['mensagem'], 'status': 'lido'}),
+        ('getall', None, 'GET', '/getall', None),
+    ]
+
+
+# Listagens paginadas: cada página, seguindo o cursor 'proximo', vira um
+# snapshot (<nome>_pagina<n>). (nome, usuário do token, caminho)
+def rotas_paginadas(ids):
+    return [
+        ('turma_alunos', 'professor', f'/turma/{ids["turma"]}/alunos?limite=8'),
+        ('unidade_cursos', 'instituicao', f'/unidade/{ids["unidade"]}/cursos?limite=4&ordem=nome'),
+    ]
+
+
+def normalizar(statement):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    statement = re.sub(r"'[^']*'", '?', statement)
+    statement = re.sub(r'\b\d+\b', '?', statement)
+    # IN com N parâmetros conta como um formato só
+    return re.sub(r'\((?:\?, )+\?\)', '(?...)', statement)
+
+
+# Plano de um SELECT e a estimativa de linhas lidas. No SQLite o EXPLAIN
+# não estima linhas, então um SCAN conta a tabela inteira e um SEARCH
+# conta 1; no MySQL usamos a coluna rows do EXPLAIN
+def plano(conexao, statement, parametros):
+    if not statement.lstrip().upper().startswith('SELECT') or isinstance(parametros, list):
+        return [], 0
+
+    if conexao.dialect.name == 'sqlite':
+        linhas = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parametros).all()
+        detalhes, estimativa = [], 0
+        for linha in linhas:
+            detalhe = linha[-1]
+            detalhes.append(detalhe)
+            partes = detalhe.split()
+            if partes[0] == 'SCAN' and len(partes) > 1 and partes[1] in db.metadata.tables:
+                estimativa += conexao.execute(select(func.count()).select_from(db.metadata.tables[partes[1]])).scalar()
+            elif partes[0] == 'SEARCH':
+                estimativa += 1
+        return detalhes, estimativa
+
+    resultado = conexao.exec_driver_sql('EXPLAIN ' + statement, parametros)
+    colunas = list(resultado.keys())
+    detalhes, estimativa = [], 0
+    for linha in resultado.all():
+        registro = dict(zip(colunas, linha))
+        detalhes.append(f'{registro.get("table")} {registro.get("type")} key={registro.get("key")} rows={registro.get("rows")}')
+        estimativa += int(registro.get('rows') or 0)
+    return detalhes, estimativa
+
+
+def gravar(engine, cliente, tokens, rota):
+    nome, usuario, metodo, caminho, corpo = rota
+    capturados = []
+
+    def capturar(conn, cursor, statement, parametros, context, executemany):
+        capturados.append((statement, parametros))
+
+    headers = {'Authorization': f'Bearer {tokens[usuario]}'} if usuario else {}
+    event.listen(engine, 'before_cursor_execute', capturar)
+    try:
+        resposta = cliente.open(caminho, method=metodo, json=corpo, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capturar)
+
+    queries = []
+    with engine.connect() as conexao:
+        for statement, parametros in capturados:
+            detalhes, estimativa = plano(conexao, statement, parametros)
+            queries.append({'sql': normalizar(statement), 'plano': detalhes, 'linhas': estimativa})
+
+    return {
+        'rota': f'{metodo} {caminho}',
+        'corpo': resposta.get_json(silent=True),
+        'status': resposta.status_code,
+        'statements': len(queries),
+        'linhas': sum(q['linhas'] for q in queries),
+        'queries': queries,
+    }
+
+
+def comparar(nome, antigo, novo):
+    erros = []
+    # Outro status quer dizer outro caminho na rota: o snapshot não vale mais
+    if novo['status'] != antigo['status']:
+        erros.append(f'status: {antigo["status"]} -> {novo["status"]}')
+    if novo['statements'] > antigo['statements'] + TOLERANCIA_STATEMENTS:
+        erros.append(f'statements: {antigo["statements"]} -> {novo["statements"]}')
+    if novo['linhas'] > antigo['linhas'] * (1 + TOLERANCIA_LINHAS) and novo['linhas'] > antigo['linhas'] + 1:
+        erros.append(f'linhas lidas (estimativa): {antigo["linhas"]} -> {novo["linhas"]}')
+    if not erros:
+        return False
+
+    print(f'\nFALHOU {nome} ({novo["rota"]}): ' + '; '.join(erros))
+    diff = difflib.unified_diff(
+        [formatar(q) for q in antigo['queries']],
+        [formatar(q) for q in novo['queries']],
+        'snapshot', 'atual', lineterm='',
+    )
+    for linha in diff:
+        print('  ' + linha)
+    return True
+
+
+def formatar(query):
+    plano = ' | '.join(query['plano'])
+    return f'{query["sql"]}  [{plano}] ~{query["linhas"]} linha(s)' if plano else query['sql']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update', action='store_true', help='Regrava os snapshots')
+    parser.add_argument('--rota', help='Só a rota com esse nome')
+    parser.add_argument('--database-url', help='Banco vazio para rodar (padrão: SQLite temporário)')
+    args = parser.parse_args()
+
+    banco = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "snapshots.db")}'
+
+    class SnapshotConfig(Config):
+        SQLALCHEMY_DATABASE_URI = banco
+        JWT_VERIFY_SUB = False
+        RATE_LIMIT_ENABLED = False
+        PROFILE_ENABLED = False
+        WRITE_BEHIND_LEITURAS = False
+        EXPIRACAO_AGENDADA = False
+        BLOCKLIST_SYNC_INTERVALO = 10 ** 9
+        BLOCKLIST_RECONSTRUCAO = 10 ** 9
+
+    app = create_app(SnapshotConfig)
+    app.config['JWT_SECRET_KEY'] = app.config['JWT_SECRET_KEY'] or 'snapshots'
+    with app.app_context():
+        db.create_all()
+        ids = popular()
+        tokens = {tipo: create_access_token(identity=ids[tipo]) for tipo in ('aluno', 'professor', 'instituicao')}
+        engine = db.engine
+
+    cliente = app.test_client()
+    # A primeira requisição autenticada sobe a thread que monta o filtro de
+    # tokens revogados; antes do filtro pronto cada token vai ao banco
+    cliente.get('/usuarios', headers={'Authorization': f'Bearer {tokens["aluno"]}'})
+    if not app.extensions['blocklist'].pronto.wait(10):
+        raise SystemExit('O filtro de tokens revogados não foi carregado')
+
+    os.makedirs(PASTA_SNAPSHOTS, exist_ok=True)
+    falhou = False
+
+    def conferir(rota):
+        nonlocal falhou
+        nome = rota[0]
+        atual = gravar(engine, cliente, tokens, rota)
+        corpo = atual.pop('corpo')
+        caminho = os.path.join(PASTA_SNAPSHOTS, f'{nome}.json')
+
+        if args.update or not os.path.exists(caminho):
+            # Um 500 só registra o SQL até o erro; isso não serve de base
+            if atual['status'] >= 500:
+                print(f'ERRO     {nome}: {atual["rota"]} respondeu {atual["status"]}, snapshot não gravado')
+                falhou = True
+                return corpo
+            with open(caminho, 'w') as arquivo:
+                json.dump(atual, arquivo, indent=2, ensure_ascii=False)
+                arquivo.write('\n')
+            print(f'gravado  {nome}: {atual["statements"]} statement(s), ~{atual["linhas"]} linha(s)')
+            return corpo
+
+        with open(caminho) as arquivo:
+            antigo = json.load(arquivo)
+        if comparar(nome, antigo, atual):
+            falhou = True
+        else:
+            print(f'ok       {nome}: {atual["statements"]} statement(s), ~{atual["linhas"]} linha(s)')
+        return corpo
+
+    for rota in rotas(ids):
+        if not args.rota or rota[0] == args.rota:
+            conferir(rota)
+
+    for nome, usuario, caminho in rotas_paginadas(ids):
+        if args.rota and nome != args.rota:
+            continue
+        proximo, pagina = None, 1
+        while True:
+            pagina_atual = caminho + (f'&apos={proximo}' if proximo else '')
+            corpo = conferir((f'{nome}_pagina{pagina}', usuario, 'GET', pagina_atual, None))
+            proximo = (corpo or {}).get('proximo')
+            if not proximo:
+                break
+            pagina += 1
+
+    if falhou:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,31 @@
-from flask import Flask, render_template, redirect, request, flash, url_for, session, abort, jsonify, send_file
-import io
-import traceback
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, g, request, jsonify
 from config import Config
-from models import *
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from json_provider import FastJSONProvider
+from compressao import init_compressao
+from blocklist import init_blocklist, revogar_token, token_revogado
+from mail_worker import init_mail
+from escritas import buffer_leituras, init_escritas
+from expiracao import init_expiracao
+from frontend import init_frontend
+from limites import init_limites, limitar
+from profiler import init_profiler
+from paginacao import paginar
+from sqlalchemy import select
+from exportacao import init_exportacao, iniciar_job, status_job
+from sharding import (init_sharding, sharding_ativo, claims_do_usuario, token_do_usuario, buscar_usuario_por_email,
+                      reservar_instituicao, trazer_usuario, trazer_usuario_por_email, UsuarioEmOutroShard, fan_out, mesclar)
+from lazy import lazy_import
+from models import (db, Usuario, Aluno, Professor, Instituicao, Unidade, Curso, ConviteProfessor,
+                    Turma, TurmaAluno, TurmaCurso, ProfessorUnidade, Mensagem)
 from datetime import datetime
-import secrets
-import base64
 from dotenv import load_dotenv
 import os
 from flask_cors import CORS
-import jwt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_bcrypt import Bcrypt
+from flask_jwt_extended import JWTManager, create_access_token, decode_token, get_jwt, jwt_required, get_jwt_identity
+
+# Os schemas introspectam os mappers quando são definidos, então só
+# carregamos o módulo no primeiro uso
+schemas = lazy_import('schemas')
 
 #.env variaveis
 load_dotenv()
@@ -22,17 +33,42 @@ load_dotenv()
 SECRET_KEY = os.getenv('SECRET_KEY')
 CLIENT_ID = os.getenv('CLIENT_ID')
 
+bp = Blueprint('api', __name__)
+jwt = JWTManager()
+jwt.token_in_blocklist_loader(token_revogado)
+
+
 #configurações app
-app = Flask(__name__) 
-app.config.from_object(Config) 
-app.config['JWT_SECRET_KEY'] = SECRET_KEY
-CORS(app, resources={r"/*": {"origins": "*"}})
-db.init_app(app)
-jwt = JWTManager(app)
-bcrypt = Bcrypt(app)
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config['JWT_SECRET_KEY'] = SECRET_KEY
+    # Config é importado antes do load_dotenv, então a chave do .env entra aqui
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = SECRET_KEY
+    app.json = FastJSONProvider(app)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    init_sharding(app)
+    db.init_app(app)
+    jwt.init_app(app)
+    init_blocklist(app)
+    init_compressao(app)
+    init_limites(app)
+    init_profiler(app)
+    init_mail(app)
+    init_exportacao(app)
+    init_expiracao(app)
+    init_escritas(app)
+    app.register_blueprint(bp)
+    init_frontend(app)
+    return app
 
 # Função que verifica token da google
 def verify_jwt(token):
+    # A stack de auth da google é pesada e só é usada no login via google
+    from google.oauth2 import id_token
+    from google.auth.transport import requests as google_requests
+
     try:
         idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), CLIENT_ID)
         if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
@@ -44,9 +80,13 @@ def verify_jwt(token):
 # Função para retornar os dados do usuário logado
 def get_current_user():
     user_id = get_jwt_identity()
-    return Usuario.query.get(user_id)
+    usuario = Usuario.query.get(user_id)
+    if usuario and not token_do_usuario(usuario):
+        return None
+    return usuario
 
-@app.route('/usuarios', methods=['POST'])
+@bp.route('/usuarios', methods=['POST'])
+@limitar('usuarios')
 def create_or_update_usuario():
     data = request.get_json()
 
@@ -69,7 +109,7 @@ def create_or_update_usuario():
 
     # Função para criar token de acesso
     def generate_access_token(user):
-        return create_access_token(identity=user.id)
+        return create_access_token(identity=user.id, additional_claims=claims_do_usuario(user))
 
     # Função para verificar e decodificar token JWT
     def decode_google_token(token):
@@ -84,11 +124,11 @@ def create_or_update_usuario():
         email = user.get('email')
 
         # Verificar se o usuário já existe
-        usuario = Usuario.find_by_email(email)
+        usuario = buscar_usuario_por_email(email)
         if usuario:
             if usuario.confirmed:
                 return jsonify({'message': 'Email já existe!'}), 409
-            return jsonify({'message': 'User nao confirmado!', 'user': UsuarioSchema().dump(usuario)})
+            return jsonify({'message': 'User nao confirmado!', 'user': schemas.UsuarioSchema().dump(usuario)})
 
         # Criar novo usuário
         novo_usuario = Usuario(nome=user.get('nome'), email=email)
@@ -97,7 +137,7 @@ def create_or_update_usuario():
 
         # Gerar token de acesso
         access_token = generate_access_token(novo_usuario)
-        return jsonify({'message': 'User created!', 'token': access_token, 'user': UsuarioSchema().dump(novo_usuario)}), 201
+        return jsonify({'message': 'User created!', 'token': access_token, 'user': schemas.UsuarioSchema().dump(novo_usuario)}), 201
 
     # Caso: Atualizando usuário existente
     if method == 'Cadastrando um novo usuário!':
@@ -105,7 +145,7 @@ def create_or_update_usuario():
         email = user.get('email')
 
         # Verificar se o usuário já existe
-        usuario_existente = Usuario.find_by_email(email)
+        usuario_existente = buscar_usuario_por_email(email)
         if usuario_existente:
             if not usuario_existente.confirmed:
                 usuario_existente.nome = user.get('nome')
@@ -120,14 +160,14 @@ def create_or_update_usuario():
 
                 # Gerar token de acesso
                 access_token = generate_access_token(usuario_existente)
-                return jsonify({"msg": "Usuário atualizado com sucesso", "token": access_token, "user": UsuarioSchema().dump(usuario_existente)}), 200
+                return jsonify({"msg": "Usuário atualizado com sucesso", "token": access_token, "user": schemas.UsuarioSchema().dump(usuario_existente)}), 200
 
             return jsonify({"msg": "Usuário já existe"}), 400
 
         # Criar novo usuário
         novo_usuario = create_new_user(user)
         access_token = generate_access_token(novo_usuario)
-        return jsonify({"msg": "Usuário criado com sucesso", "token": access_token, "user": UsuarioSchema().dump(novo_usuario)}), 201
+        return jsonify({"msg": "Usuário criado com sucesso", "token": access_token, "user": schemas.UsuarioSchema().dump(novo_usuario)}), 201
 
     # Caso: Acesso via Google
     if method == 'Google acess':
@@ -143,13 +183,13 @@ def create_or_update_usuario():
         email = decoded_token['email']
 
         # Verificar se o usuário já existe
-        usuario = Usuario.find_by_email(email)
+        usuario = buscar_usuario_por_email(email)
         if usuario:
             if usuario.confirmed:
                 access_token = generate_access_token(usuario)
-                return jsonify({'message': 'Login successful!', 'token': access_token, 'user': UsuarioSchema().dump(usuario)})
+                return jsonify({'message': 'Login successful!', 'token': access_token, 'user': schemas.UsuarioSchema().dump(usuario)})
 
-            return jsonify({'message': 'User nao confirmado!', 'user': UsuarioSchema().dump(usuario)})
+            return jsonify({'message': 'User nao confirmado!', 'user': schemas.UsuarioSchema().dump(usuario)})
 
         # Criar novo usuário
         novo_usuario = Usuario(
@@ -162,11 +202,12 @@ def create_or_update_usuario():
         db.session.commit()
 
         access_token = generate_access_token(novo_usuario)
-        return jsonify({'message': 'User created!', 'token': access_token, 'user': UsuarioSchema().dump(novo_usuario)}), 201
+        return jsonify({'message': 'User created!', 'token': access_token, 'user': schemas.UsuarioSchema().dump(novo_usuario)}), 201
 
     return jsonify({'error': 'Invalid method!'}), 400
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
+@limitar('login')
 def login():
     #recebe email e senha
     data = request.get_json()
@@ -174,44 +215,73 @@ def login():
     senha = data.get('senha')
 
     #verifica usuario e senha corretos
-    usuario = Usuario.find_by_email(email)
+    usuario = buscar_usuario_por_email(email)
     if not usuario:
         return jsonify({"msg": "Bad email or password"}), 401
     if not usuario.check_password(senha):
         return jsonify({"msg": "Bad password"}), 401
 
     #passa token para acessar o usuario
-    access_token = create_access_token(identity=usuario.id)
+    access_token = create_access_token(identity=usuario.id, additional_claims=claims_do_usuario(usuario))
     return jsonify(access_token=access_token), 200
 
-@app.route('/usuarios', methods=['GET'])
+@bp.route('/logout', methods=['POST'])
+@jwt_required() #solicita o jwt
+def logout():
+    revogar_token(get_jwt())
+    return jsonify({"msg": "Logout realizado"}), 200
+
+@bp.route('/token/revogar', methods=['POST'])
+@jwt_required() #solicita o jwt
+def revogar():
+    # Revoga outro token do mesmo usuário (ex: de uma sessão vazada)
+    data = request.get_json()
+    token = data.get('token') if data else None
+    if not token:
+        return jsonify({"msg": "Token não recebido"}), 400
+
+    try:
+        payload = decode_token(token, allow_expired=True)
+    except Exception:
+        return jsonify({"msg": "Token inválido"}), 400
+
+    if str(payload.get('sub')) != str(get_jwt_identity()):
+        return jsonify({"msg": "Token de outro usuário"}), 403
+
+    revogar_token(payload)
+    return jsonify({"msg": "Token revogado"}), 200
+
+@bp.route('/usuarios', methods=['GET'])
 @jwt_required()
 def get_usuarios():
     usuario = get_current_user()
 
+    if not usuario:
+        return jsonify({"msg": "User not found"}), 404
+
     if usuario.tipo == "aluno":
-        aluno_schema = AlunoSchema()
+        aluno_schema = schemas.AlunoSchema()
         return jsonify({
-            'usuario': UsuarioSchema().dump(usuario),
+            'usuario': schemas.UsuarioSchema().dump(usuario),
             'aluno': aluno_schema.dump(usuario.aluno)
         })
     elif usuario.tipo == "professor":
-        professor_schema = ProfessorSchema()
+        professor_schema = schemas.ProfessorSchema()
         return jsonify({
-            'usuario': UsuarioSchema().dump(usuario),
+            'usuario': schemas.UsuarioSchema().dump(usuario),
             'professor': professor_schema.dump(usuario.professor)
         })
     elif usuario.tipo == 'instituicao':
-        instituicao_schema = InstituicaoSchema()
+        instituicao_schema = schemas.InstituicaoSchema()
         return jsonify({
-            'usuario': UsuarioSchema().dump(usuario),
+            'usuario': schemas.UsuarioSchema().dump(usuario),
             'instituicao': instituicao_schema.dump(usuario.instituicao),
 
         })
     else:
         return jsonify({"msg": "User not found"}), 404
 
-@app.route('/instituicao', methods=['POST'])
+@bp.route('/instituicao', methods=['POST'])
 @jwt_required() #solicita o jwt
 def add_instituicao():
     # Verifica qual é o usuário
@@ -226,7 +296,15 @@ def add_instituicao():
         if not nome_instituicao:
             return jsonify({"msg": "Nome da instituição é obrigatório"}), 400
 
+        id_instituicao = None
+        if sharding_ativo():
+            # A instituição vai para o shard do SHARD_MAP e o dono vai junto
+            registro = reservar_instituicao()
+            id_instituicao = registro.id
+            usuario = trazer_usuario(usuario, get_jwt().get('shard'), registro.shard)
+
         instituicao_created = Instituicao(
+            id=id_instituicao,
             id_usuario=usuario.id,
             nome=nome_instituicao,
             confirmed=True
@@ -235,13 +313,20 @@ def add_instituicao():
         db.session.add(instituicao_created)
         db.session.commit()
 
-        return jsonify({'msg' : "Insituição criada", 'instituicao': InstituicaoSchema().dump(instituicao_created)}), 201
+        resposta = {'msg' : "Insituição criada", 'instituicao': schemas.InstituicaoSchema().dump(instituicao_created)}
+        if sharding_ativo():
+            # O usuário pode ter mudado de banco (e de id): o token antigo não vale mais
+            resposta['token'] = create_access_token(identity=usuario.id, additional_claims=claims_do_usuario(usuario))
+        return jsonify(resposta), 201
+    except UsuarioEmOutroShard:
+        db.session.rollback()
+        return jsonify({"msg": "Usuário já tem dados em outro banco"}), 409
     except Exception as e:
         print(f"Erro: {e}")
         db.session.rollback()
         return jsonify({"msg": "Erro ao adicionar instituição"}), 500
 
-@app.route('/instituicao/unidade', methods=['POST'])
+@bp.route('/instituicao/unidade', methods=['POST'])
 @jwt_required() #solicita o jwt
 def add_unidade():
     # Verifica qual é o usuário
@@ -269,13 +354,13 @@ def add_unidade():
         db.session.add(unidade_created)
         db.session.commit()
 
-        return jsonify({'msg' : "Unidade criada", 'unidade': UnidadeSchema().dump(unidade_created)}), 201
+        return jsonify({'msg' : "Unidade criada", 'unidade': schemas.UnidadeSchema().dump(unidade_created)}), 201
     except Exception as e:
         print(f"Erro: {e}")
         db.session.rollback()
         return jsonify({"msg": "Erro ao adicionar unidade"}), 500
 
-@app.route('/curso', methods=['POST'])
+@bp.route('/curso', methods=['POST'])
 @jwt_required() #solicita o jwt
 def add_curso():
     # Verifica qual é o usuário
@@ -300,13 +385,13 @@ def add_curso():
         db.session.add(new_curso)
         db.session.commit()
 
-        return jsonify({'msg' : "Curso criado", 'curso': CursoSchema().dump(new_curso)}), 201
+        return jsonify({'msg' : "Curso criado", 'curso': schemas.CursoSchema().dump(new_curso)}), 201
     except Exception as e:
         print(f"Erro: {e}")
         db.session.rollback()
         return jsonify({"msg": "Erro ao adicionar curso"}), 500
 
-@app.route('/convite', methods=['POST'])
+@bp.route('/convite', methods=['POST'])
 @jwt_required() #solicita o jwt
 def add_convite():
     # Verifica qual é o usuário
@@ -319,7 +404,9 @@ def add_convite():
         data = request.get_json()
         convite = data.get('convite')
         email_professor = convite.get('email_professor')
-        usuario_convidado = Usuario.find_by_email(email_professor)
+        # Com sharding o professor pode estar em outro banco: ele é trazido
+        # para o shard da instituição que convida
+        usuario_convidado = trazer_usuario_por_email(email_professor)
 
         if not usuario_convidado:
             return jsonify({"msg": "Email não corresponde a nenhum professor"}), 400
@@ -351,13 +438,16 @@ def add_convite():
         db.session.add(new_convite)
         db.session.commit()
 
-        return jsonify({'msg' : "Convite criado", 'convite': ConviteProfessorSchema().dump(new_convite)}), 201
+        return jsonify({'msg' : "Convite criado", 'convite': schemas.ConviteProfessorSchema().dump(new_convite)}), 201
+    except UsuarioEmOutroShard:
+        db.session.rollback()
+        return jsonify({"msg": "Professor já pertence a outra instituição"}), 409
     except Exception as e:
         print(f"Erro: {e}")
         db.session.rollback()
         return jsonify({"msg": "Erro ao adicionar convite"}), 500
 
-@app.route('/convite', methods=['PUT'])
+@bp.route('/convite', methods=['PUT'])
 @jwt_required() #solicita o jwt
 def change_convite():
     # Verifica qual é o usuário
@@ -372,43 +462,32 @@ def change_convite():
         convite = convite_data.get('convite')
         convite_professor = convite.get('convite_professor')
         mode = data.get('mode')
-        print(convite_professor)
         if not convite_data:
             return jsonify({"msg": "Dados do convite não fornecidos"}), 400
 
-        convite = ConviteProfessor.getPorId(convite_professor.get('id'))
-
-        if not convite:
-            return jsonify({"msg": "Convite não encontrado"}), 400
+        convite_id = convite_professor.get('id')
 
         if mode == 'aceitar':
-            if convite.status == "aceito":
-                return jsonify({"msg": "Convite já aceito"}), 400
-            if convite.status == "recusado":
-                return jsonify({"msg": "Convite já recusado"}), 400
-            if convite.status == "pendente":
-                professor_unidade = ProfessorUnidade(
-                    id_unidade=convite.id_unidade,
-                    id_professor=convite.id_professor
-                )
-                
-                convite.status = "aceito"
-                #mudar mensagem
-                db.session.add(professor_unidade)
+            if ConviteProfessor.aceitar(convite_id):
                 db.session.commit()
-                return jsonify({"msg": "Convite aceito com sucesso", 'convite': ConviteProfessorSchema().dump(convite)}), 200
-
-        if mode == 'recusar':
-            if convite.status == "recusado":
-                return jsonify({"msg": "Convite já recusado"}), 400
-            if convite.status == "aceito":
-                return jsonify({"msg": "Convite já aceito"}), 400
-            if convite.status == "pendente":
-                convite.status = "recusado"
+                convite = ConviteProfessor.getPorId(convite_id)
+                return jsonify({"msg": "Convite aceito com sucesso", 'convite': schemas.ConviteProfessorSchema().dump(convite)}), 200
+        elif mode == 'recusar':
+            if ConviteProfessor.recusar(convite_id):
                 db.session.commit()
-                return jsonify({"msg": "Convite recusado com sucesso", 'convite': ConviteProfessorSchema().dump(convite)}), 200
+                convite = ConviteProfessor.getPorId(convite_id)
+                return jsonify({"msg": "Convite recusado com sucesso", 'convite': schemas.ConviteProfessorSchema().dump(convite)}), 200
+        else:
+            return jsonify({"msg": "Modo inválido"}), 400
 
-        return jsonify({"msg": "Modo inválido"}), 400
+        # Nenhuma linha mudou: o convite não existe ou já foi respondido
+        db.session.rollback()
+        status = ConviteProfessor.status_atual(convite_id)
+        if status is None:
+            return jsonify({"msg": "Convite não encontrado"}), 400
+        if status == "aceito":
+            return jsonify({"msg": "Convite já aceito"}), 400
+        return jsonify({"msg": "Convite já recusado"}), 400
     except Exception as e:
         print(f"Erro: {e}")
         db.session.rollback()
@@ -416,7 +495,7 @@ def change_convite():
 
 
 
-@app.route('/msg/status', methods=['PUT'])
+@bp.route('/msg/status', methods=['PUT'])
 @jwt_required() #solicita o jwt
 def change_status_msg():
     # Verifica qual é o usuário
@@ -433,21 +512,30 @@ def change_status_msg():
         if not mensagem_id:
             return jsonify({"msg": "Dados do convite não fornecidos"}), 400
 
-        msg = Mensagem.getPorId(mensagem_id)
-
-        if not msg:
-            return jsonify({"msg": "Mensagem não encontrada"}), 400
+        try:
+            mensagem_id = int(mensagem_id)
+        except (TypeError, ValueError):
+            return jsonify({"msg": "Id da mensagem inválido"}), 400
 
         if status == 'lido':
-            if msg.status == "lido":
-                return jsonify({"msg": "msg já lida"}), 400
-            if msg.status == "respondido":
-                return jsonify({"msg": "msg já respondido"}), 400
-            if msg.status == "enviado":
-                msg.status = "lido"
+            # Confirmação de leitura não é crítica: vai para o buffer e é
+            # gravada em lote, no banco de onde a requisição veio
+            if buffer_leituras():
+                buffer_leituras().adicionar((g.get('shard'), mensagem_id))
+                return jsonify({"msg": "Leitura registrada"}), 202
+
+            if Mensagem.marcar_lida(mensagem_id):
                 db.session.commit()
                 return jsonify({"msg": "Msg lida com sucesso"}), 200
 
+            # Nenhuma linha mudou: a mensagem não existe ou já saiu de 'enviado'
+            db.session.rollback()
+            status_atual = Mensagem.status_atual(mensagem_id)
+            if status_atual is None:
+                return jsonify({"msg": "Mensagem não encontrada"}), 400
+            if status_atual == "lido":
+                return jsonify({"msg": "msg já lida"}), 400
+            return jsonify({"msg": "msg já respondido"}), 400
 
         return jsonify({"msg": "Modo inválido"}), 400
     except Exception as e:
@@ -455,42 +543,138 @@ def change_status_msg():
         db.session.rollback()
         return jsonify({"msg": "Erro ao atualizar convite"}), 500
 
-@app.route('/getall', methods=['GET'])
-def get_all():
+# Ordenações aceitas nas listagens paginadas: colunas não nulas terminando no id
+ORDENS_ALUNOS = {
+    'nome': (Usuario.nome, Aluno.id),
+    'id': (Aluno.id,),
+}
+ORDENS_CURSOS = {
+    'nome': (Curso.nome, Curso.id),
+    'create_time': (Curso.create_time, Curso.id),
+    'id': (Curso.id,),
+}
+
+# Pagina uma consulta com os parâmetros ordem, direcao, limite e apos (cursor)
+def listar_paginado(consulta, ordens, chave):
+    ordem = request.args.get('ordem', 'nome')
+    if ordem not in ordens:
+        return jsonify({"msg": "Ordem inválida"}), 400
+
     try:
-        usuarios = Usuario.query.all()
-        alunos = Aluno.query.all()
-        professores = Professor.query.all()
-        instituicoes = Instituicao.query.all()
-        unidades = Unidade.query.all()
-        cursos = Curso.query.all()
-        convites_professores = ConviteProfessor.query.all()
-        turmas = Turma.query.all()
-        turmas_alunos = TurmaAluno.query.all()
-        turmas_cursos = TurmaCurso.query.all()
-        professores_unidades = ProfessorUnidade.query.all()
+        itens, proximo = paginar(
+            db.session,
+            consulta,
+            ordens[ordem],
+            limite=request.args.get('limite'),
+            cursor=request.args.get('apos'),
+            desc=request.args.get('direcao') == 'desc',
+        )
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Paginação inválida"}), 400
 
-        return jsonify({
-            "usuarios": UsuarioSchema(many=True).dump(usuarios),
-            "alunos": AlunoSchema(many=True).dump(alunos),
-            "professores": ProfessorSchema(many=True).dump(professores),
-            "instituicoes": InstituicaoSchema(many=True).dump(instituicoes),
-            "unidades": UnidadeSchema(many=True).dump(unidades),
-            "cursos": CursoSchema(many=True).dump(cursos),
-            "convites_professores": ConviteProfessorSchema(many=True).dump(convites_professores),
-            "turmas": TurmaSchema(many=True).dump(turmas),
-            "turmas_alunos": TurmaAlunoSchema(many=True).dump(turmas_alunos),
-            "turmas_cursos": TurmaCursoSchema(many=True).dump(turmas_cursos),
-            "professores_unidades": ProfessorUnidadeSchema(many=True).dump(professores_unidades),
-        }), 200
+    return jsonify({chave: itens, 'proximo': proximo}), 200
+
+@bp.route('/turma/<int:id_turma>/alunos', methods=['GET'])
+@jwt_required() #solicita o jwt
+def get_turma_alunos(id_turma):
+    consulta = (
+        select(
+            Aluno.id,
+            Aluno.matricula,
+            Usuario.id.label('id_usuario'),
+            Usuario.nome,
+            Usuario.sobrenome,
+            Usuario.email,
+            Usuario.img_link,
+        )
+        .select_from(TurmaAluno)
+        .join(Aluno, Aluno.id == TurmaAluno.id_aluno)
+        .join(Usuario, Usuario.id == Aluno.id_usuario)
+        .where(TurmaAluno.id_turma == id_turma)
+    )
+    return listar_paginado(consulta, ORDENS_ALUNOS, 'alunos')
+
+@bp.route('/unidade/<int:id_unidade>/cursos', methods=['GET'])
+@jwt_required() #solicita o jwt
+def get_unidade_cursos(id_unidade):
+    consulta = (
+        select(
+            Curso.id,
+            Curso.nome,
+            Curso.descricao,
+            Curso.confirmed,
+            Curso.create_time,
+            Curso.id_professor,
+            Usuario.nome.label('professor_nome'),
+            Usuario.sobrenome.label('professor_sobrenome'),
+        )
+        .outerjoin(Professor, Professor.id == Curso.id_professor)
+        .outerjoin(Usuario, Usuario.id == Professor.id_usuario)
+        .where(Curso.id_unidade == id_unidade)
+    )
+    return listar_paginado(consulta, ORDENS_CURSOS, 'cursos')
+
+# Carrega todas as tabelas do banco da session atual
+def coletar_tudo():
+    usuarios = Usuario.query.all()
+    alunos = Aluno.query.all()
+    professores = Professor.query.all()
+    instituicoes = Instituicao.query.all()
+    unidades = Unidade.query.all()
+    cursos = Curso.query.all()
+    convites_professores = ConviteProfessor.query.all()
+    turmas = Turma.query.all()
+    turmas_alunos = TurmaAluno.query.all()
+    turmas_cursos = TurmaCurso.query.all()
+    professores_unidades = ProfessorUnidade.query.all()
+
+    return {
+        "usuarios": schemas.UsuarioSchema(many=True).dump(usuarios),
+        "alunos": schemas.AlunoSchema(many=True).dump(alunos),
+        "professores": schemas.ProfessorSchema(many=True).dump(professores),
+        "instituicoes": schemas.InstituicaoSchema(many=True).dump(instituicoes),
+        "unidades": schemas.UnidadeSchema(many=True).dump(unidades),
+        "cursos": schemas.CursoSchema(many=True).dump(cursos),
+        "convites_professores": schemas.ConviteProfessorSchema(many=True).dump(convites_professores),
+        "turmas": schemas.TurmaSchema(many=True).dump(turmas),
+        "turmas_alunos": schemas.TurmaAlunoSchema(many=True).dump(turmas_alunos),
+        "turmas_cursos": schemas.TurmaCursoSchema(many=True).dump(turmas_cursos),
+        "professores_unidades": schemas.ProfessorUnidadeSchema(many=True).dump(professores_unidades),
+    }
+
+@bp.route('/getall', methods=['GET'])
+@limitar('getall')
+def get_all():
+    try:
+        if sharding_ativo():
+            # Lê todos os shards em paralelo e junta o resultado
+            return jsonify(mesclar(fan_out(coletar_tudo))), 200
+        return jsonify(coletar_tudo()), 200
     except Exception as e:
         print(f"Erro: {e}")
         return jsonify({"msg": "Erro ao buscar dados"}), 500
 
-# Manipulador de erros 404
-@app.errorhandler(404)
-def not_found(error):
-    return redirect("http://localhost:4200"), 404
+@bp.route('/exportacao', methods=['POST'])
+@jwt_required() #solicita o jwt
+@limitar('exportacao')
+def start_exportacao():
+    data = request.get_json(silent=True) or {}
+    formato = data.get('formato', 'parquet')
+    if formato not in ('parquet', 'arrow'):
+        return jsonify({"msg": "Formato inválido"}), 400
+
+    job, iniciado = iniciar_job(formato, bool(data.get('completo')))
+    if not iniciado:
+        return jsonify({"msg": "Já existe uma exportação em andamento", "job": job}), 409
+    return jsonify({"msg": "Exportação iniciada", "job": job}), 202
+
+@bp.route('/exportacao/<job_id>', methods=['GET'])
+@jwt_required() #solicita o jwt
+def get_exportacao(job_id):
+    job = status_job(job_id)
+    if not job:
+        return jsonify({"msg": "Exportação não encontrada"}), 404
+    return jsonify({"job": job}), 200
 
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0')
+    create_app().run(debug=True, host='0.0.0.0')
@@ -0,0 +1,171 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TokenRevogado
+
+# Revogação de tokens JWT. Os jti revogados ficam na tabela token_revogado
+# até o token expirar; cada worker mantém um filtro de Bloom com esses jti,
+# sincronizado por uma thread a cada BLOCKLIST_SYNC_INTERVALO. Um token que
+# não está no filtro com certeza não foi revogado (caso comum, sem I/O); se
+# estiver, confirmamos no banco por causa dos falsos positivos. Até a thread
+# carregar o primeiro filtro, todo token é conferido no banco.
+
+
+class FiltroBloom:
+    def __init__(self, capacidade, taxa_erro):
+        self.capacidade = capacidade
+        self.bits = max(8, int(-capacidade * math.log(taxa_erro) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacidade * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.itens = 0
+
+    # Double hashing: as k posições saem de dois hashes de 64 bits
+    def _posicoes(self, valor):
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, valor):
+        for posicao in self._posicoes(valor):
+            self.array[posicao >> 3] |= 1 << (posicao & 7)
+        self.itens += 1
+
+    def __contains__(self, valor):
+        return all(self.array[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(valor))
+
+
+class ListaBloqueio:
+    def __init__(self, capacidade, taxa_erro, intervalo, reconstrucao):
+        self.capacidade = capacidade
+        self.taxa_erro = taxa_erro
+        self.intervalo = intervalo
+        self.reconstrucao = reconstrucao
+        self.filtro = FiltroBloom(capacidade, taxa_erro)
+        self.marca = None  # maior create_time já carregado no filtro
+        self.ultima_reconstrucao = 0
+        self.pronto = threading.Event()  # o primeiro filtro já veio do banco
+        # Só protege a troca do filtro e os adds; nenhum I/O com o lock
+        self.lock = threading.Lock()
+        self.parar = threading.Event()
+        self.thread = None
+
+    # Apaga os jti de tokens já expirados e monta um filtro novo só com os
+    # que ainda valem (o filtro de Bloom não permite remover itens). As
+    # requisições continuam usando o filtro antigo até a troca
+    def reconstruir(self):
+        agora = datetime.utcnow()
+        db.session.execute(delete(TokenRevogado).where(TokenRevogado.expira <= agora))
+        db.session.commit()
+
+        linhas = db.session.execute(
+            select(TokenRevogado.jti, TokenRevogado.create_time).where(TokenRevogado.expira > agora)
+        ).all()
+        capacidade = self.capacidade
+        while len(linhas) > capacidade * 0.8:
+            capacidade *= 2
+
+        filtro = FiltroBloom(capacidade, self.taxa_erro)
+        for linha in linhas:
+            filtro.add(linha.jti)
+        # Um revogar() local entre o SELECT e a troca cai no filtro antigo;
+        # a próxima sincronização traz esse jti pela margem da marca
+        with self.lock:
+            self.filtro = filtro
+        self.marca = max((linha.create_time for linha in linhas), default=None)
+        self.ultima_reconstrucao = time.monotonic()
+        self.pronto.set()
+
+    # Roda na thread: busca só os jti revogados desde a última sincronização
+    # (inclusive os revogados por outros workers)
+    def sincronizar(self):
+        if (not self.pronto.is_set() or time.monotonic() - self.ultima_reconstrucao >= self.reconstrucao
+                or self.filtro.itens > self.filtro.capacidade):
+            self.reconstruir()
+            return
+
+        consulta = select(TokenRevogado.jti, TokenRevogado.create_time)
+        if self.marca:
+            # Margem para não perder linhas commitadas fora de ordem
+            consulta = consulta.where(TokenRevogado.create_time > self.marca - timedelta(seconds=self.intervalo))
+        linhas = db.session.execute(consulta).all()
+        with self.lock:
+            for linha in linhas:
+                self.filtro.add(linha.jti)
+        self.marca = max([linha.create_time for linha in linhas] + ([self.marca] if self.marca else []), default=None)
+
+    def revogado(self, jti):
+        if self.thread is None:
+            self.start(current_app._get_current_object())
+        if self.pronto.is_set() and jti not in self.filtro:
+            return False
+        return db.session.execute(
+            select(TokenRevogado.jti).where(TokenRevogado.jti == jti, TokenRevogado.expira > datetime.utcnow())
+        ).first() is not None
+
+    def revogar(self, jti, expira, id_usuario=None):
+        try:
+            db.session.add(TokenRevogado(jti=jti, expira=expira, id_usuario=id_usuario))
+            db.session.commit()
+        except IntegrityError:
+            # Já estava revogado
+            db.session.rollback()
+        with self.lock:
+            self.filtro.add(jti)
+
+    def _loop(self, app):
+        with app.app_context():
+            while True:
+                try:
+                    self.sincronizar()
+                except Exception as e:
+                    app.logger.exception(f'Erro ao sincronizar os tokens revogados: {e}')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                if self.parar.wait(self.intervalo):
+                    return
+
+    # A thread sobe na primeira requisição autenticada do worker, não no
+    # create_app: assim o init_db e os comandos do CLI não a iniciam
+    def start(self, app):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, args=(app,), name='blocklist-sync', daemon=True)
+                self.thread.start()
+        return self
+
+    def stop(self):
+        self.parar.set()
+        if self.thread:
+            self.thread.join()
+
+
+def lista_bloqueio():
+    return current_app.extensions['blocklist']
+
+
+# Callback do token_in_blocklist_loader do JWTManager
+def token_revogado(jwt_header, jwt_payload):
+    return lista_bloqueio().revogado(jwt_payload['jti'])
+
+
+def revogar_token(payload):
+    expira = datetime.utcfromtimestamp(payload['exp'])
+    lista_bloqueio().revogar(payload['jti'], expira, payload.get('sub'))
+
+
+def init_blocklist(app):
+    app.extensions['blocklist'] = ListaBloqueio(
+        app.config['BLOCKLIST_CAPACIDADE'],
+        app.config['BLOCKLIST_TAXA_ERRO'],
+        app.config['BLOCKLIST_SYNC_INTERVALO'],
+        app.config['BLOCKLIST_RECONSTRUCAO'],
+    )
@@ -0,0 +1,81 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+# brotli é opcional: sem ele só oferecemos gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Escolhe a codificação pelo Accept-Encoding do cliente (respeitando o q=)
+def escolher_codificacao():
+    oferecidas = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(oferecidas)
+
+
+def comprimir(data, codificacao, config):
+    if codificacao == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'])
+
+
+# Comprime uma resposta em streaming pedaço por pedaço, com flush a cada
+# pedaço para o cliente não ficar esperando o fim do stream
+def comprimir_stream(pedacos, codificacao, config):
+    if codificacao == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BR_LEVEL'])
+        for pedaco in pedacos:
+            if isinstance(pedaco, str):
+                pedaco = pedaco.encode('utf-8')
+            saida = compressor.process(pedaco) + compressor.flush()
+            if saida:
+                yield saida
+        yield compressor.finish()
+    else:
+        # wbits=31 gera o cabeçalho gzip
+        compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        for pedaco in pedacos:
+            if isinstance(pedaco, str):
+                pedaco = pedaco.encode('utf-8')
+            saida = compressor.compress(pedaco) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if saida:
+                yield saida
+        yield compressor.flush()
+
+
+def comprimir_resposta(response):
+    config = current_app.config
+    if not config['COMPRESS_ENABLED']:
+        return response
+
+    # Respostas de arquivo (send_file) e já codificadas passam direto
+    if (response.direct_passthrough
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    codificacao = escolher_codificacao()
+    if not codificacao:
+        return response
+
+    if response.is_streamed:
+        response.response = comprimir_stream(response.response, codificacao, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(comprimir(data, codificacao, config))
+
+    response.headers['Content-Encoding'] = codificacao
+    return response
+
+
+def init_compressao(app):
+    app.after_request(comprimir_resposta)
@@ -10,3 +10,78 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)  # Ajuste conforme necessário
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # Ajuste conforme necessário
+
+    # Compressão das respostas (gzip/brotli)
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500  # bytes; abaixo disso não compensa comprimir
+    COMPRESS_LEVEL = 6
+    COMPRESS_BR_LEVEL = 4
+    COMPRESS_MIMETYPES = {'application/json', 'text/html', 'text/css', 'text/plain', 'application/javascript'}
+
+    # Envio de emails (Flask-Mail) e fila de envio em background
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'false').lower() == 'true'
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'no-reply@makequestions.com')
+    MAIL_WORKERS = 2
+    MAIL_LOTE = 50  # emails por conexão SMTP
+    MAIL_INTERVALO = 5  # segundos entre consultas quando a fila está vazia
+    MAIL_MAX_TENTATIVAS = 5
+    MAIL_BACKOFF_BASE = 30  # segundos
+    MAIL_ENVIO_TIMEOUT = 300  # segundos até um lote 'enviando' ser considerado abandonado
+
+    # Sharding por instituição (ver sharding.py). Vazio = tudo no banco padrão
+    SHARDS = {}  # nome do shard -> URI do banco
+    SHARD_MAP = {}  # id da instituição -> nome do shard
+
+    # Exportação colunar (Parquet/Arrow) para relatórios
+    EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(os.path.dirname(__file__), '..', 'exports'))
+    EXPORT_LOTE = 10000  # linhas por row group
+
+    # Expiração de convites pendentes
+    CONVITE_TTL = timedelta(days=30)
+    EXPIRACAO_LOTE = 500  # convites por transação
+    EXPIRACAO_INTERVALO = 3600  # segundos entre execuções agendadas
+    EXPIRACAO_AGENDADA = os.getenv('EXPIRACAO_AGENDADA', 'false').lower() == 'true'
+
+    # Build do Angular servido pelo backend. Sem ele, 404 redireciona para o ng serve
+    FRONTEND_DIST = os.getenv('FRONTEND_DIST')
+    FRONTEND_DEV_URL = 'http://localhost:4200'
+
+    # Rate limiting das rotas caras: nome -> (requisições, janela em segundos)
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMITS = {
+        'login': (10, 60),
+        'usuarios': (10, 60),
+        'getall': (6, 60),
+        'exportacao': (2, 60),
+    }
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')  # vazio = buckets em memória
+    ADMISSAO_MAX_CONCORRENTES = 4  # rotas caras rodando ao mesmo tempo por processo
+    ADMISSAO_MAX_FILA = 8  # requisições esperando vaga antes de responder 503
+    ADMISSAO_TIMEOUT = 5  # segundos esperando vaga
+    ADMISSAO_RETRY_AFTER = 5
+
+    # Profiler por amostragem (ver profiler.py)
+    PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'false').lower() == 'true'
+    PROFILE_SAMPLE_RATE = 100  # amostra 1 em cada N requisições (0 = só com o header de debug)
+    PROFILE_INTERVAL = 0.005  # segundos entre amostras
+    PROFILE_MAX_ROTAS = 50
+    PROFILE_MAX_PILHAS = 500  # pilhas distintas guardadas por rota
+    PROFILE_MAX_PROFUNDIDADE = 64
+    PROFILE_TOKEN_TTL = 300  # segundos de validade do header de debug
+
+    # Tokens revogados (logout): filtro de Bloom por worker, ver blocklist.py
+    BLOCKLIST_CAPACIDADE = 100000  # jti esperados antes de o filtro crescer
+    BLOCKLIST_TAXA_ERRO = 0.001  # falsos positivos (que custam uma consulta)
+    BLOCKLIST_SYNC_INTERVALO = 5  # segundos entre sincronizações com o banco
+    BLOCKLIST_RECONSTRUCAO = 3600  # segundos entre limpezas dos tokens expirados
+
+    # Buffer write-behind das confirmações de leitura (ver escritas.py)
+    WRITE_BEHIND_LEITURAS = os.getenv('WRITE_BEHIND_LEITURAS', 'false').lower() == 'true'
+    WRITE_BEHIND_DIR = os.getenv('WRITE_BEHIND_DIR', os.path.join(os.path.dirname(__file__), '..', 'write-behind'))
+    WRITE_BEHIND_INTERVALO = 2  # segundos entre gravações em lote
+    WRITE_BEHIND_LOTE = 500  # ids por UPDATE
+    WRITE_BEHIND_FSYNC = True
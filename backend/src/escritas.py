@@ -0,0 +1,184 @@
+import glob
+import json
+import os
+import threading
+
+from flask import current_app, g
+from sqlalchemy import update
+
+from models import db, Mensagem
+
+# Buffer write-behind para campos não críticos (confirmação de leitura):
+# as escritas vão para um log local com fsync e são aplicadas no banco em
+# lote a cada WRITE_BEHIND_INTERVALO segundos. Se o processo morrer, o
+# próximo worker reaplica o log. Cada item é gravado como JSON; listas
+# voltam como tuplas, como o (shard, id) das leituras.
+
+
+class BufferEscrita:
+    def __init__(self, pasta, nome, aplicar, fsync=True):
+        self.pasta = pasta
+        self.nome = nome
+        self.aplicar = aplicar
+        self.fsync = fsync
+        self.pendentes = set()
+        self.lock = threading.Lock()
+        self.parar = threading.Event()
+        self.thread = None
+        os.makedirs(pasta, exist_ok=True)
+        self.caminho = os.path.join(pasta, f'{nome}-{os.getpid()}.log')
+
+        # Logs com o nosso pid são de um processo anterior que teve o mesmo
+        # pid (o normal depois de reiniciar o container): os ids voltam para
+        # o lote pendente e o .flush é regravado no log atual antes de sumir
+        em_andamento = self.caminho + '.flush'
+        self.pendentes |= ler_ids(self.caminho)
+        sobras = ler_ids(em_andamento)
+        self.arquivo = open(self.caminho, 'a')
+        if sobras:
+            self.arquivo.write(''.join(json.dumps(id) + '\n' for id in sobras))
+            self.arquivo.flush()
+            if fsync:
+                os.fsync(self.arquivo.fileno())
+            self.pendentes |= sobras
+        if os.path.exists(em_andamento):
+            os.remove(em_andamento)
+
+    def adicionar(self, id):
+        with self.lock:
+            self.arquivo.write(json.dumps(id) + '\n')
+            self.arquivo.flush()
+            if self.fsync:
+                os.fsync(self.arquivo.fileno())
+            self.pendentes.add(id)
+
+    # Logs de workers que morreram sem aplicar tudo. Dois workers podem
+    # recuperar o mesmo log; o UPDATE é idempotente, então reaplicar não tem
+    # problema, e o arquivo que o outro já apagou é só ignorado
+    def recuperar(self):
+        for caminho in glob.glob(os.path.join(self.pasta, f'{self.nome}-*.log*')):
+            pid = os.path.basename(caminho)[len(self.nome) + 1:].split('.')[0]
+            if not pid.isdigit() or int(pid) == os.getpid() or processo_vivo(int(pid)):
+                continue
+            ids = ler_ids(caminho)
+            if ids:
+                self.aplicar(ids)
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def descarregar(self):
+        with self.lock:
+            if not self.pendentes:
+                return 0
+            ids, self.pendentes = self.pendentes, set()
+            # Troca o log: o antigo só é apagado depois que o lote foi aplicado
+            self.arquivo.close()
+            em_andamento = self.caminho + '.flush'
+            os.replace(self.caminho, em_andamento)
+            self.arquivo = open(self.caminho, 'a')
+
+        try:
+            self.aplicar(ids)
+        except Exception:
+            # Devolve para a próxima rodada, de volta no log atual
+            with self.lock:
+                self.pendentes |= ids
+                self.arquivo.write(''.join(json.dumps(id) + '\n' for id in ids))
+                self.arquivo.flush()
+            os.remove(em_andamento)
+            raise
+        os.remove(em_andamento)
+        return len(ids)
+
+    def _loop(self, app):
+        with app.app_context():
+            try:
+                self.recuperar()
+            except Exception as e:
+                app.logger.exception(f'Erro ao recuperar logs do buffer {self.nome}: {e}')
+            finally:
+                db.session.remove()
+            while not self.parar.wait(app.config['WRITE_BEHIND_INTERVALO']):
+                try:
+                    self.descarregar()
+                except Exception as e:
+                    app.logger.exception(f'Erro ao gravar o buffer {self.nome}: {e}')
+                finally:
+                    db.session.remove()
+
+    def start(self, app):
+        self.thread = threading.Thread(target=self._loop, args=(app,), name=f'write-behind-{self.nome}', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.parar.set()
+        if self.thread:
+            self.thread.join()
+        self.descarregar()
+        self.arquivo.close()
+
+
+def ler_ids(caminho):
+    try:
+        with open(caminho) as arquivo:
+            return {ler_item(linha) for linha in arquivo if linha.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def ler_item(linha):
+    item = json.loads(linha)
+    return tuple(item) if isinstance(item, list) else item
+
+
+def processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Aplica as leituras em lotes, banco a banco: cada item é (shard, id) e só
+# mensagens ainda 'enviado' viram 'lido'. Logs de versões anteriores têm só
+# o id, que é do banco padrão
+def aplicar_leituras(itens):
+    por_shard = {}
+    for item in itens:
+        shard, id = item if isinstance(item, tuple) else (None, item)
+        por_shard.setdefault(shard, []).append(id)
+
+    lote = current_app.config['WRITE_BEHIND_LOTE']
+    try:
+        for shard, ids in por_shard.items():
+            if shard is not None and shard not in current_app.config['SHARDS']:
+                current_app.logger.warning(f'Descartando {len(ids)} leitura(s) do shard desconhecido {shard}')
+                continue
+            g.shard = shard
+            ids.sort()
+            for inicio in range(0, len(ids), lote):
+                db.session.execute(
+                    update(Mensagem)
+                    .where(Mensagem.id.in_(ids[inicio:inicio + lote]), Mensagem.status == 'enviado')
+                    .values(status='lido')
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+    finally:
+        g.shard = None
+
+
+def buffer_leituras():
+    return current_app.extensions.get('buffer_leituras')
+
+
+def init_escritas(app):
+    if not app.config['WRITE_BEHIND_LEITURAS']:
+        return
+    buffer = BufferEscrita(app.config['WRITE_BEHIND_DIR'], 'leituras', aplicar_leituras, app.config['WRITE_BEHIND_FSYNC'])
+    app.extensions['buffer_leituras'] = buffer.start(app)
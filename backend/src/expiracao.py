@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, g
+from sqlalchemy import and_, or_, select, update
+
+from models import db, Convite, ConviteAluno, ConviteProfessor, Mensagem
+from sharding import bancos
+
+
+# Expira um lote de convites vencidos. A iteração é por keyset em
+# (create_time, id), então cada lote começa de onde o anterior parou
+def expirar_lote(modelo, coluna_convite, limite, cursor, tamanho):
+    consulta = (
+        select(modelo.id, modelo.create_time)
+        .where(modelo.status == 'pendente', modelo.create_time < limite)
+        .order_by(modelo.create_time, modelo.id)
+        .limit(tamanho)
+    )
+    if cursor:
+        ultimo_create_time, ultimo_id = cursor
+        consulta = consulta.where(or_(
+            modelo.create_time > ultimo_create_time,
+            and_(modelo.create_time == ultimo_create_time, modelo.id > ultimo_id),
+        ))
+
+    linhas = db.session.execute(consulta).all()
+    if not linhas:
+        db.session.rollback()
+        return 0, 0, None
+
+    ids = [linha.id for linha in linhas]
+    agora = datetime.utcnow()
+    convites = db.session.execute(
+        update(modelo)
+        .where(modelo.id.in_(ids), modelo.status == 'pendente')
+        .values(status='expirado', data_resposta=agora)
+        .execution_options(synchronize_session=False)
+    )
+    mensagens = db.session.execute(
+        update(Mensagem)
+        .where(
+            Mensagem.id_convite.in_(select(Convite.id).where(coluna_convite.in_(ids))),
+            Mensagem.status.in_(('enviado', 'lido')),
+        )
+        .values(status='expirado', data_resposta=agora)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return convites.rowcount, mensagens.rowcount, (linhas[-1].create_time, linhas[-1].id)
+
+
+def expirar_convites(ttl=None, tamanho=None):
+    config = current_app.config
+    limite = datetime.utcnow() - (ttl or config['CONVITE_TTL'])
+    tamanho = tamanho or config['EXPIRACAO_LOTE']
+    inicio = time.perf_counter()
+
+    # Com sharding cada banco tem os próprios convites: a varredura roda uma
+    # vez por banco
+    resultado = {'convite_professor': 0, 'convite_aluno': 0, 'mensagem': 0, 'lotes': 0, 'bancos': 0}
+    try:
+        for shard in bancos():
+            g.shard = shard
+            for modelo, coluna_convite in ((ConviteProfessor, Convite.id_convite_professor),
+                                           (ConviteAluno, Convite.id_convite_aluno)):
+                cursor = None
+                while True:
+                    convites, mensagens, cursor = expirar_lote(modelo, coluna_convite, limite, cursor, tamanho)
+                    if cursor is None:
+                        break
+                    resultado[modelo.__tablename__] += convites
+                    resultado['mensagem'] += mensagens
+                    resultado['lotes'] += 1
+            db.session.remove()
+            resultado['bancos'] += 1
+    finally:
+        g.shard = None
+
+    resultado['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    current_app.logger.info(
+        'Expiração de convites: %(convite_professor)s convite(s) de professor, %(convite_aluno)s de aluno, '
+        '%(mensagem)s mensagem(ns) em %(lotes)s lote(s) de %(bancos)s banco(s), %(duracao_ms)s ms', resultado
+    )
+    return resultado
+
+
+class AgendadorExpiracao:
+    def __init__(self, app):
+        self.app = app
+        self.parar = threading.Event()
+        self.thread = None
+
+    def _loop(self):
+        with self.app.app_context():
+            while not self.parar.is_set():
+                try:
+                    expirar_convites()
+                except Exception as e:
+                    self.app.logger.exception(f'Erro na expiração de convites: {e}')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                self.parar.wait(self.app.config['EXPIRACAO_INTERVALO'])
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='expiracao-convites', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.parar.set()
+        if self.thread:
+            self.thread.join()
+
+
+@click.command('expirar-convites')
+@click.option('--dias', type=int, default=None, help='Validade dos convites em dias (padrão: CONVITE_TTL)')
+def expirar_convites_command(dias):
+    resultado = expirar_convites(timedelta(days=dias) if dias else None)
+    for chave, valor in resultado.items():
+        click.echo(f'{chave}: {valor}')
+
+
+def init_expiracao(app):
+    app.cli.add_command(expirar_convites_command)
+    if app.config['EXPIRACAO_AGENDADA']:
+        AgendadorExpiracao(app).start()
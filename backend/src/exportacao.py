@@ -0,0 +1,268 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import Boolean, Date, DateTime, Integer, LargeBinary, select
+
+from models import db
+from sharding import bancos
+
+# Tabelas exportadas e colunas que nunca saem do banco (segredos e BLOBs)
+TABELAS = {
+    'usuarios': ('senha', 'image'),
+    'alunos': (),
+    'professores': (),
+    'instituicao': (),
+    'unidade': (),
+    'curso': (),
+    'turmas': (),
+    'turmas_alunos': (),
+    'turmas_curso': (),
+    'professor_unidade': (),
+    'convite_professor': (),
+    'convite_aluno': (),
+    'convites': (),
+    'mensagem': (),
+}
+
+ARQUIVO_WATERMARKS = '_watermarks.json'
+ARQUIVO_LOCK = '_exportacao.lock'
+
+jobs = {}
+jobs_lock = threading.Lock()
+
+
+class ExportacaoEmAndamento(RuntimeError):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise RuntimeError('A exportação precisa do pacote pyarrow instalado')
+    return pyarrow
+
+
+def tipo_arrow(pa, tipo):
+    if isinstance(tipo, Boolean):
+        return pa.bool_()
+    if isinstance(tipo, Integer):
+        return pa.int64()
+    if isinstance(tipo, DateTime):
+        return pa.timestamp('us')
+    if isinstance(tipo, Date):
+        return pa.date32()
+    if isinstance(tipo, LargeBinary):
+        return pa.binary()
+    return pa.string()
+
+
+# Coluna usada para exportar só o que mudou desde a última execução. As
+# tabelas que mudam depois de criadas têm update_time; create_time só serve
+# para as que nunca são alteradas
+def coluna_watermark(tabela):
+    for nome in ('update_time', 'create_time'):
+        if nome in tabela.c:
+            return tabela.c[nome]
+    return None
+
+
+# O watermark de uma tabela é o maior valor exportado e as chaves das linhas
+# com esse valor. A próxima execução usa >= (o DATETIME do MySQL só guarda
+# segundos, então outras linhas podem ter sido gravadas no mesmo segundo) e
+# pula só as chaves que já saíram. Watermarks antigos eram só a data
+def ler_marca(marca):
+    if not marca:
+        return None, set()
+    if isinstance(marca, str):
+        return datetime.fromisoformat(marca), set()
+    return datetime.fromisoformat(marca['desde']), {tuple(chave) for chave in marca['chaves']}
+
+
+def ler_watermarks(destino):
+    caminho = os.path.join(destino, ARQUIVO_WATERMARKS)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho) as arquivo:
+        return json.load(arquivo)
+
+
+def salvar_watermarks(destino, watermarks):
+    caminho = os.path.join(destino, ARQUIVO_WATERMARKS)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as arquivo:
+        json.dump(watermarks, arquivo, indent=2)
+    os.replace(temporario, caminho)
+
+
+# Uma exportação por vez em cada pasta de destino, mesmo entre processos
+# (workers do gunicorn, o comando exportar): duas ao mesmo tempo disputariam
+# o _watermarks.json. O lock do SO some junto com o processo
+def travar_destino(destino):
+    arquivo = open(os.path.join(destino, ARQUIVO_LOCK), 'w')
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        arquivo.close()
+        raise ExportacaoEmAndamento(f'Já existe uma exportação em andamento em {destino}')
+    return arquivo
+
+
+def abrir_writer(pa, caminho, schema, formato):
+    if formato == 'arrow':
+        return pa.ipc.new_file(caminho, schema)
+    return pa.parquet.ParquetWriter(caminho, schema)
+
+
+# Exporta uma tabela em lotes direto do cursor, sem carregar tudo na memória
+def exportar_tabela(pa, conexao, tabela, excluidas, destino, formato, marca, lote, execucao):
+    colunas = [c for c in tabela.c if c.name not in excluidas]
+    schema = pa.schema([(c.name, tipo_arrow(pa, c.type)) for c in colunas])
+    watermark = coluna_watermark(tabela)
+    chaves = [c.name for c in tabela.primary_key.columns]
+    desde, ja_exportadas = ler_marca(marca)
+
+    consulta = select(*colunas)
+    if watermark is not None:
+        if desde:
+            consulta = consulta.where(watermark >= desde)
+        consulta = consulta.order_by(watermark, *tabela.primary_key.columns)
+
+    pasta = os.path.join(destino, tabela.name)
+    os.makedirs(pasta, exist_ok=True)
+    # O id da execução deixa o nome único mesmo com duas no mesmo segundo
+    caminho = os.path.join(pasta, f'{datetime.utcnow():%Y%m%dT%H%M%S}-{execucao}.{formato}')
+
+    linhas = 0
+    maximo, no_maximo = desde, list(ja_exportadas)
+    writer = None
+    resultado = conexao.execution_options(stream_results=True, yield_per=lote).execute(consulta)
+    for pedaco in resultado.partitions(lote):
+        if watermark is not None:
+            novas = []
+            for linha in pedaco:
+                valor = linha._mapping[watermark.name]
+                chave = tuple(linha._mapping[nome] for nome in chaves)
+                if valor == desde and chave in ja_exportadas:
+                    continue
+                novas.append(linha)
+                if valor is None:
+                    continue
+                if maximo is None or valor > maximo:
+                    maximo, no_maximo = valor, [chave]
+                elif valor == maximo:
+                    no_maximo.append(chave)
+            pedaco = novas
+            if not pedaco:
+                continue
+
+        if writer is None:
+            writer = abrir_writer(pa, caminho, schema, formato)
+        dados = {c.name: [linha[i] for linha in pedaco] for i, c in enumerate(colunas)}
+        writer.write_batch(pa.RecordBatch.from_pydict(dados, schema=schema))
+        linhas += len(pedaco)
+
+    if writer is not None:
+        writer.close()
+    if maximo is None:
+        return linhas, None
+    return linhas, {'desde': maximo.isoformat(), 'chaves': [list(chave) for chave in no_maximo]}
+
+
+# Exporta todas as tabelas de um banco. Os watermarks ficam na pasta do
+# banco e só avançam depois que todas as tabelas foram escritas
+def exportar_banco(pa, engine, destino, formato, completo, lote, execucao):
+    os.makedirs(destino, exist_ok=True)
+    watermarks = {} if completo else ler_watermarks(destino)
+    relatorio = {}
+    with engine.connect() as conexao:
+        for nome, excluidas in TABELAS.items():
+            tabela = db.metadata.tables[nome]
+            # Tabelas sem coluna de data são exportadas inteiras toda vez
+            linhas, marca = exportar_tabela(
+                pa, conexao, tabela, excluidas, destino, formato, watermarks.get(nome), lote, execucao
+            )
+            if marca:
+                watermarks[nome] = marca
+            relatorio[nome] = linhas
+
+    salvar_watermarks(destino, watermarks)
+    return relatorio
+
+
+# Exporta o banco padrão na raiz do destino e cada shard em shards/<nome>/,
+# com os próprios watermarks (os ids só são únicos dentro de cada banco).
+# No relatório as tabelas dos shards aparecem como <shard>/<tabela>
+def exportar(destino, formato='parquet', completo=False, lote=None, execucao=None):
+    if formato not in ('parquet', 'arrow'):
+        raise ValueError('Formato deve ser parquet ou arrow')
+
+    pa = _pyarrow()
+    lote = lote or current_app.config['EXPORT_LOTE']
+    execucao = execucao or uuid.uuid4().hex
+    os.makedirs(destino, exist_ok=True)
+
+    relatorio = {}
+    with travar_destino(destino):
+        for shard in bancos():
+            pasta = destino if shard is None else os.path.join(destino, 'shards', shard)
+            linhas = exportar_banco(pa, db.engines[shard], pasta, formato, completo, lote, execucao)
+            for nome, quantidade in linhas.items():
+                relatorio[nome if shard is None else f'{shard}/{nome}'] = quantidade
+    return relatorio
+
+
+# Roda a exportação numa thread e guarda o status em `jobs`. Só um job roda
+# por vez: se já houver um, ele é retornado com iniciado=False
+def iniciar_job(formato='parquet', completo=False):
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    with jobs_lock:
+        rodando = next((job for job in jobs.values() if job['status'] == 'rodando'), None)
+        if rodando:
+            return dict(rodando), False
+        jobs[job_id] = {'id': job_id, 'status': 'rodando', 'formato': formato, 'inicio': datetime.utcnow().isoformat()}
+        job = dict(jobs[job_id])
+
+    def rodar():
+        with app.app_context():
+            try:
+                relatorio = exportar(app.config['EXPORT_DIR'], formato, completo, execucao=job_id)
+                atualizacao = {'status': 'concluido', 'linhas': relatorio}
+            except Exception as e:
+                app.logger.exception(f'Erro na exportação: {e}')
+                atualizacao = {'status': 'erro', 'erro': str(e)}
+            atualizacao['fim'] = datetime.utcnow().isoformat()
+            with jobs_lock:
+                jobs[job_id].update(atualizacao)
+
+    threading.Thread(target=rodar, name=f'exportacao-{job_id}', daemon=True).start()
+    return job, True
+
+
+def status_job(job_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+        return dict(job) if job else None
+
+
+@click.command('exportar')
+@click.option('--destino', default=None, help='Pasta de saída (padrão: EXPORT_DIR)')
+@click.option('--formato', type=click.Choice(['parquet', 'arrow']), default='parquet')
+@click.option('--completo', is_flag=True, help='Ignora os watermarks e exporta tudo')
+def exportar_command(destino, formato, completo):
+    relatorio = exportar(destino or current_app.config['EXPORT_DIR'], formato, completo)
+    for tabela, linhas in relatorio.items():
+        click.echo(f'{tabela}: {linhas} linha(s)')
+
+
+def init_exportacao(app):
+    app.cli.add_command(exportar_command)
@@ -0,0 +1,75 @@
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, jsonify, redirect, request, send_file
+
+# Arquivos com hash no nome gerados pelo ng build: 'main-2XK7ZQ4M.js'
+# (esbuild) ou 'main.3f1c0a9b7e2d4f6a.js' (webpack)
+ARQUIVO_COM_HASH = re.compile(r'[.-]([0-9a-f]{16,20}|(?=[0-9A-Z]*[0-9])[0-9A-Z]{8})\.[A-Za-z0-9]+$')
+
+# Variantes pré-comprimidas geradas no build, por ordem de preferência
+PRE_COMPRIMIDOS = (('br', '.br'), ('gzip', '.gz'))
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def caminho_no_dist(caminho):
+    raiz = os.path.realpath(current_app.config['FRONTEND_DIST'])
+    completo = os.path.realpath(os.path.join(raiz, caminho))
+    # Não deixa '../' sair da pasta do build
+    if completo != raiz and not completo.startswith(raiz + os.sep):
+        return None
+    return completo if os.path.isfile(completo) else None
+
+
+# Envia o arquivo do build, usando a versão .br/.gz se o cliente aceitar.
+# send_file entrega o arquivo via wsgi.file_wrapper, que o gunicorn
+# transforma em sendfile() (sem copiar o conteúdo para o Python)
+def enviar_arquivo(completo, cache_control):
+    mimetype = mimetypes.guess_type(completo)[0] or 'application/octet-stream'
+    arquivo, codificacao = completo, None
+    for nome, extensao in PRE_COMPRIMIDOS:
+        if request.accept_encodings[nome] and os.path.isfile(completo + extensao):
+            arquivo, codificacao = completo + extensao, nome
+            break
+
+    response = send_file(arquivo, mimetype=mimetype, conditional=True, etag=True)
+    if codificacao:
+        response.headers['Content-Encoding'] = codificacao
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def servir_frontend(caminho=''):
+    if not current_app.config['FRONTEND_DIST']:
+        abort(404)
+
+    completo = caminho_no_dist(caminho) if caminho else None
+    if completo:
+        imutavel = ARQUIVO_COM_HASH.search(os.path.basename(completo))
+        return enviar_arquivo(completo, CACHE_IMUTAVEL if imutavel else 'no-cache')
+
+    # Arquivo que não existe no build (ex: asset antigo) não vira index.html
+    if '.' in os.path.basename(caminho):
+        abort(404)
+
+    # Fallback da SPA: rotas do Angular recebem o index.html
+    index = caminho_no_dist('index.html')
+    if not index:
+        abort(404)
+    return enviar_arquivo(index, 'no-cache')
+
+
+# Sem build configurado (desenvolvimento) o front roda no ng serve
+def not_found(error):
+    if not current_app.config['FRONTEND_DIST']:
+        return redirect(current_app.config['FRONTEND_DEV_URL']), 404
+    return jsonify({"msg": "Not found"}), 404
+
+
+def init_frontend(app):
+    app.add_url_rule('/', 'frontend', servir_frontend, methods=['GET'])
+    app.add_url_rule('/<path:caminho>', 'frontend', servir_frontend, methods=['GET'])
+    app.register_error_handler(404, not_found)
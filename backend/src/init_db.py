@@ -1,8 +1,16 @@
 # Criar um arquivo separado init_db.py para criar as tabelas no banco de dados
 
 # init_db.py
-from app import app
+from app import create_app
 from models import db
 
+app = create_app()
+
+# O create_all só cria as tabelas que faltam; num banco MySQL que já
+# existia, as mudanças nas tabelas antigas estão nos scripts de migrations/
 with app.app_context():
     db.create_all()
+
+    # Cada shard tem o schema completo
+    for shard in app.config['SHARDS']:
+        db.metadata.create_all(db.engines[shard])
@@ -0,0 +1,55 @@
+import base64
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import JSONProvider
+
+# orjson é opcional: sem ele caímos no json da stdlib com a mesma saída
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+# Converte os tipos que o encoder não conhece (ex: BLOB de imagem do usuário)
+def _default(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(obj)).decode('ascii')
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(JSONProvider):
+    # Mantém a ordem dos campos como vem dos schemas
+    sort_keys = False
+
+    def _encode(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        # Argumentos extras (indent, sort_keys...) só o json da stdlib entende
+        if kwargs:
+            kwargs.setdefault('default', _default)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj), mimetype='application/json')
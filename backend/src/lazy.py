@@ -0,0 +1,16 @@
+import importlib.util
+import sys
+
+
+# Importa um módulo de forma preguiçosa: o código só roda no primeiro
+# acesso a um atributo
+def lazy_import(nome):
+    if nome in sys.modules:
+        return sys.modules[nome]
+    spec = importlib.util.find_spec(nome)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    loader.exec_module(modulo)
+    return modulo
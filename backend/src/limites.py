@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+# Rate limiting por token bucket (por usuário do JWT ou IP) e controle de
+# admissão das rotas caras, que devolve 503 quando a fila enche.
+
+
+class MemoriaBackend:
+    # Acima disso, buckets cheios (ociosos) são descartados
+    MAX_CHAVES = 10000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consumir(self, chave, taxa, capacidade, custo=1):
+        agora = time.monotonic()
+        with self.lock:
+            tokens, ultimo, _ = self.buckets.get(chave, (capacidade, agora, 0))
+            tokens = min(capacidade, tokens + (agora - ultimo) * taxa)
+            if tokens >= custo:
+                tokens -= custo
+                permitido, espera = True, 0.0
+            else:
+                permitido, espera = False, (custo - tokens) / taxa
+            # Guarda também quando o bucket estará cheio de novo
+            self.buckets[chave] = (tokens, agora, agora + (capacidade - tokens) / taxa)
+
+            if len(self.buckets) > self.MAX_CHAVES:
+                self._limpar(agora)
+        return permitido, espera
+
+    def _limpar(self, agora):
+        for chave, (_, _, cheio) in list(self.buckets.items()):
+            # Um bucket que já encheu de novo é igual a um bucket novo
+            if cheio <= agora:
+                del self.buckets[chave]
+
+
+# Mesmo algoritmo num script Lua, atômico no Redis e com o relógio do
+# próprio Redis, para todos os nós enxergarem o mesmo bucket
+SCRIPT_TOKEN_BUCKET = '''
+local taxa = tonumber(ARGV[1])
+local capacidade = tonumber(ARGV[2])
+local custo = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(estado[1]) or capacidade
+local ultimo = tonumber(estado[2]) or agora
+tokens = math.min(capacidade, tokens + (agora - ultimo) * taxa)
+local permitido = 0
+local espera = 0
+if tokens >= custo then
+    tokens = tokens - custo
+    permitido = 1
+else
+    espera = (custo - tokens) / taxa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / taxa * 1000) + 1000)
+return {permitido, tostring(espera)}
+'''
+
+
+class RedisBackend:
+    def __init__(self, cliente, prefixo='rl:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.script = cliente.register_script(SCRIPT_TOKEN_BUCKET)
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def consumir(self, chave, taxa, capacidade, custo=1):
+        permitido, espera = self.script(keys=[self.prefixo + chave], args=[taxa, capacidade, custo])
+        return bool(int(permitido)), float(espera)
+
+
+# Limita quantas requisições caras rodam ao mesmo tempo neste processo;
+# as que passam do limite esperam numa fila curta ou recebem 503
+class ControleAdmissao:
+    def __init__(self, maximo, fila, timeout):
+        self.semaforo = threading.BoundedSemaphore(maximo)
+        self.fila = fila
+        self.timeout = timeout
+        self.esperando = 0
+        self.lock = threading.Lock()
+
+    def entrar(self):
+        with self.lock:
+            if self.esperando >= self.fila:
+                return False
+            self.esperando += 1
+        try:
+            return self.semaforo.acquire(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.esperando -= 1
+
+    def sair(self):
+        self.semaforo.release()
+
+
+def resposta_limite(status, msg, espera):
+    response = jsonify({"msg": msg})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+    return response
+
+
+# Usuário do JWT quando houver token válido, senão o IP
+def identidade_requisicao():
+    try:
+        verify_jwt_in_request(optional=True)
+        identidade = get_jwt_identity()
+    except Exception:
+        identidade = None
+    if identidade is not None:
+        return f'user:{identidade}'
+    return f'ip:{request.remote_addr}'
+
+
+# Decorator das rotas caras: aplica o orçamento Config.RATE_LIMITS[nome]
+# (requisições por janela em segundos) e o controle de admissão
+def limitar(nome):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            limites = current_app.extensions['limites']
+
+            if config['RATE_LIMIT_ENABLED'] and nome in config['RATE_LIMITS']:
+                requisicoes, janela = config['RATE_LIMITS'][nome]
+                chave = f'{nome}:{identidade_requisicao()}'
+                permitido, espera = limites['backend'].consumir(chave, requisicoes / janela, requisicoes)
+                if not permitido:
+                    return resposta_limite(429, "Muitas requisições, tente novamente mais tarde", espera)
+
+            admissao = limites['admissao']
+            if not admissao.entrar():
+                return resposta_limite(503, "Servidor ocupado, tente novamente mais tarde", config['ADMISSAO_RETRY_AFTER'])
+            try:
+                return f(*args, **kwargs)
+            finally:
+                admissao.sair()
+        return wrapper
+    return decorator
+
+
+def init_limites(app):
+    url = app.config['RATE_LIMIT_REDIS_URL']
+    app.extensions['limites'] = {
+        'backend': RedisBackend.from_url(url) if url else MemoriaBackend(),
+        'admissao': ControleAdmissao(
+            app.config['ADMISSAO_MAX_CONCORRENTES'],
+            app.config['ADMISSAO_MAX_FILA'],
+            app.config['ADMISSAO_TIMEOUT'],
+        ),
+    }
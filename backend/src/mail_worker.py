@@ -0,0 +1,164 @@
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, g
+from flask_mail import Mail, Message
+from sqlalchemy import and_, or_, select, update
+
+from models import db, EmailFila
+from sharding import bancos
+
+mail = Mail()
+
+
+# Reserva um lote de emails para este worker. O UPDATE marca as linhas com
+# um token de lote e repete o filtro do SELECT: sem SKIP LOCKED (SQLite) dois
+# workers podem selecionar os mesmos ids, mas só o primeiro UPDATE os pega
+def reservar_lote(tamanho):
+    config = current_app.config
+    agora = datetime.utcnow()
+    travados = agora - timedelta(seconds=config['MAIL_ENVIO_TIMEOUT'])
+    disponiveis = or_(
+        and_(EmailFila.status == 'pendente', EmailFila.proxima_tentativa <= agora),
+        # Lotes de um worker que morreu no meio do envio
+        and_(EmailFila.status == 'enviando', EmailFila.update_time < travados),
+    )
+
+    ids = db.session.execute(
+        select(EmailFila.id)
+        .where(disponiveis)
+        .order_by(EmailFila.proxima_tentativa, EmailFila.id)
+        .limit(tamanho)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    if not ids:
+        db.session.commit()
+        return []
+
+    token = secrets.token_hex(16)
+    db.session.execute(
+        update(EmailFila)
+        .where(EmailFila.id.in_(ids), disponiveis)
+        .values(status='enviando', lote=token, update_time=agora)
+    )
+    db.session.commit()
+
+    return db.session.execute(select(EmailFila).where(EmailFila.lote == token)).scalars().all()
+
+
+# Backoff exponencial com jitter a partir de MAIL_BACKOFF_BASE segundos
+def calcular_backoff(tentativas):
+    base = current_app.config['MAIL_BACKOFF_BASE']
+    return timedelta(seconds=base * 2 ** (tentativas - 1) * random.uniform(0.8, 1.2))
+
+
+def registrar_falha(email, erro):
+    email.tentativas += 1
+    email.ultimo_erro = str(erro)
+    email.lote = None
+    if email.tentativas >= current_app.config['MAIL_MAX_TENTATIVAS']:
+        # Dead letter: fica na tabela com status 'falhou' para inspeção
+        email.status = 'falhou'
+    else:
+        email.status = 'pendente'
+        email.proxima_tentativa = datetime.utcnow() + calcular_backoff(email.tentativas)
+
+
+# Envia um lote reaproveitando a mesma conexão SMTP para todos os emails
+def enviar_lote(emails):
+    enviados = []
+    try:
+        with mail.connect() as conexao:
+            for email in emails:
+                try:
+                    conexao.send(Message(subject=email.assunto, recipients=[email.destinatario], body=email.corpo))
+                    enviados.append(email.id)
+                except Exception as e:
+                    registrar_falha(email, e)
+    except Exception as e:
+        # Não conseguiu abrir (ou perdeu) a conexão: o resto do lote volta para a fila
+        for email in emails:
+            if email.id not in enviados and email.status == 'enviando':
+                registrar_falha(email, e)
+
+    if enviados:
+        db.session.execute(
+            update(EmailFila)
+            .where(EmailFila.id.in_(enviados))
+            .values(status='enviado', lote=None, ultimo_erro=None)
+        )
+    db.session.commit()
+    return len(enviados)
+
+
+def processar_fila(tamanho=None):
+    emails = reservar_lote(tamanho or current_app.config['MAIL_LOTE'])
+    if not emails:
+        return 0, 0
+    return len(emails), enviar_lote(emails)
+
+
+# Uma passada pela fila de cada banco: com sharding o email fica no banco
+# onde o insert que o gerou foi feito. Um banco com erro não para os outros
+def processar_filas():
+    reservados = 0
+    for shard in bancos():
+        g.shard = shard
+        try:
+            reservados += processar_fila()[0]
+        except Exception as e:
+            current_app.logger.exception(f'Erro no envio de emails ({shard or "padrão"}): {e}')
+            db.session.rollback()
+        finally:
+            db.session.remove()
+    g.shard = None
+    return reservados
+
+
+class MailWorker:
+    def __init__(self, app, workers=None):
+        self.app = app
+        self.workers = workers or app.config['MAIL_WORKERS']
+        self.parar = threading.Event()
+        self.threads = []
+
+    def _loop(self):
+        with self.app.app_context():
+            while not self.parar.is_set():
+                reservados = processar_filas()
+                if not reservados:
+                    self.parar.wait(self.app.config['MAIL_INTERVALO'])
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'mail-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.parar.set()
+        for thread in self.threads:
+            thread.join()
+
+
+@click.command('mail-worker')
+@click.option('--workers', type=int, default=None, help='Quantidade de threads de envio')
+def mail_worker_command(workers):
+    worker = MailWorker(current_app._get_current_object(), workers).start()
+    click.echo(f'Enviando emails com {worker.workers} worker(s). Ctrl+C para sair.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+def init_mail(app):
+    mail.init_app(app)
+    app.cli.add_command(mail_worker_command)
@@ -2,12 +2,12 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlalchemy.orm as so
-from sqlalchemy import Enum, LargeBinary, String, Date, DateTime, Boolean, Integer, ForeignKey, Text, event, func
+from sqlalchemy import Enum, LargeBinary, String, Date, DateTime, Boolean, Integer, ForeignKey, Index, Text, event, func, select, update
+from sqlalchemy.exc import NoResultFound
 from typing import List
-from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
-from marshmallow_sqlalchemy.fields import Nested, fields
+from sharding import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -88,6 +88,7 @@ class Turma(db.Model):
     fim: so.Mapped[Date] = so.mapped_column(Date, nullable=True)
     periodo: so.Mapped[str] = so.mapped_column(String(45), nullable=True)
     create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+    update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     professor: so.Mapped['Professor'] = so.relationship('Professor', back_populates='turmas')
     alunos: so.Mapped[List['TurmaAluno']] = so.relationship('TurmaAluno', back_populates='turma')
     turmas_cursos: so.Mapped[List['TurmaCurso']] = so.relationship('TurmaCurso', back_populates='turma')
@@ -110,7 +111,8 @@ class Curso(db.Model):
     id_professor: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('professores.id'), nullable=True)
     descricao: so.Mapped[str] = so.mapped_column(Text, nullable=True)
     confirmed: so.Mapped[bool] = so.mapped_column(Boolean, nullable=True, default=False)
-    create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+    # Não nulo: é uma das ordenações da listagem paginada (keyset)
+    create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     unidade: so.Mapped['Unidade'] = so.relationship('Unidade', back_populates='cursos')
     professor: so.Mapped['Professor'] = so.relationship('Professor', back_populates='cursos')
@@ -156,6 +158,16 @@ class Instituicao(db.Model):
     usuario: so.Mapped['Usuario'] = so.relationship('Usuario', back_populates='instituicao', uselist=False)
 
 
+class InstituicaoShard(db.Model):
+    __tablename__ = 'instituicao_shard'
+    # Diretório global: reserva o id de cada instituição (único entre todos
+    # os bancos) e guarda o shard onde ela ficou (ver sharding.py)
+    __global__ = True
+    id: so.Mapped[int] = so.mapped_column(Integer, primary_key=True, autoincrement=True)
+    shard: so.Mapped[str] = so.mapped_column(String(64), nullable=True)
+    create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+
+
 class TurmaCurso(db.Model):
     __tablename__ = 'turmas_curso'
     id_turma: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('turmas.id'), primary_key=True)
@@ -174,13 +186,15 @@ class ProfessorUnidade(db.Model):
 
 class ConviteProfessor(db.Model):
     __tablename__ = 'convite_professor'
+    __table_args__ = (Index('ix_convite_professor_status_create_time', 'status', 'create_time', 'id'),)
     id: so.Mapped[int] = so.mapped_column(Integer, primary_key=True, autoincrement=True)
     id_unidade: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('unidade.id'))
     id_professor: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('professores.id'))
     email_professor: so.Mapped[str] = so.mapped_column(String(255), nullable=False)
-    status: so.Mapped[str] = so.mapped_column(Enum('pendente', 'aceito', 'recusado'), nullable=False, default='pendente')
+    status: so.Mapped[str] = so.mapped_column(Enum('pendente', 'aceito', 'recusado', 'expirado'), nullable=False, default='pendente')
     create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
-    data_resposta: so.Mapped[DateTime] = so.mapped_column(DateTime)
+    update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    data_resposta: so.Mapped[DateTime] = so.mapped_column(DateTime, nullable=True)
     unidade: so.Mapped['Unidade'] = so.relationship('Unidade', back_populates='convites')
     professor: so.Mapped['Professor'] = so.relationship('Professor', back_populates='convites')
     convites = db.relationship('Convite', back_populates='convite_professor')
@@ -196,20 +210,85 @@ class ConviteProfessor(db.Model):
         except NoResultFound:
             return None
 
+    # Aceita o convite e vincula o professor à unidade. Retorna False se o
+    # convite não estava mais pendente (outra requisição respondeu antes)
+    @classmethod
+    def aceitar(cls, convite_id):
+        if not responder_convite(cls, convite_id, 'aceito'):
+            return False
+        db.session.execute(insert_ignorando_duplicado(
+            ProfessorUnidade.__table__,
+            ['id_unidade', 'id_professor'],
+            select(cls.id_unidade, cls.id_professor).where(cls.id == convite_id)
+        ))
+        responder_mensagens_convite(Convite.id_convite_professor, convite_id)
+        return True
+
+    @classmethod
+    def recusar(cls, convite_id):
+        if not responder_convite(cls, convite_id, 'recusado'):
+            return False
+        responder_mensagens_convite(Convite.id_convite_professor, convite_id)
+        return True
+
+    @classmethod
+    def status_atual(cls, convite_id):
+        return db.session.execute(select(cls.status).where(cls.id == convite_id)).scalar()
+
 
 class ConviteAluno(db.Model):
     __tablename__ = 'convite_aluno'
+    __table_args__ = (Index('ix_convite_aluno_status_create_time', 'status', 'create_time', 'id'),)
     id: so.Mapped[int] = so.mapped_column(Integer, primary_key=True, autoincrement=True)
     id_turma: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('turmas.id'), nullable=False)
     id_aluno: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('alunos.id'), nullable=True)
     email_aluno: so.Mapped[str] = so.mapped_column(String(255), nullable=False)
-    status: so.Mapped[str] = so.mapped_column(Enum('pendente', 'aceito', 'recusado'), nullable=False, default='pendente')
+    status: so.Mapped[str] = so.mapped_column(Enum('pendente', 'aceito', 'recusado', 'expirado'), nullable=False, default='pendente')
     create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+    update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     data_resposta: so.Mapped[DateTime] = so.mapped_column(DateTime, nullable=True)
     turma: so.Mapped['Turma'] = so.relationship('Turma', back_populates='convites_alunos')
     aluno: so.Mapped['Aluno'] = so.relationship('Aluno', back_populates='convites')
     convites = db.relationship('Convite', back_populates='convite_aluno')
 
+    @classmethod
+    def getPorId(cls, convite_id):
+        try:
+            return db.session.query(cls).filter_by(id=convite_id).one()
+        except NoResultFound:
+            return None
+
+    # Aceita o convite e matricula o aluno na turma. Convites feitos só pelo
+    # email ganham o aluno que tem esse email; sem aluno, o convite continua
+    # pendente e retorna False
+    @classmethod
+    def aceitar(cls, convite_id):
+        aluno_do_email = (select(Aluno.id)
+                          .join(Usuario, Usuario.id == Aluno.id_usuario)
+                          .where(Usuario.email == cls.email_aluno)
+                          .scalar_subquery())
+        id_aluno = func.coalesce(cls.id_aluno, aluno_do_email)
+        if not responder_convite(cls, convite_id, 'aceito', id_aluno.is_not(None), id_aluno=id_aluno):
+            return False
+        db.session.execute(insert_ignorando_duplicado(
+            TurmaAluno.__table__,
+            ['id_turma', 'id_aluno'],
+            select(cls.id_turma, cls.id_aluno).where(cls.id == convite_id)
+        ))
+        responder_mensagens_convite(Convite.id_convite_aluno, convite_id)
+        return True
+
+    @classmethod
+    def recusar(cls, convite_id):
+        if not responder_convite(cls, convite_id, 'recusado'):
+            return False
+        responder_mensagens_convite(Convite.id_convite_aluno, convite_id)
+        return True
+
+    @classmethod
+    def status_atual(cls, convite_id):
+        return db.session.execute(select(cls.status).where(cls.id == convite_id)).scalar()
+
 
 class Convite(db.Model):
     __tablename__ = 'convites'
@@ -226,8 +305,9 @@ class Mensagem(db.Model):
     id: so.Mapped[int] = so.mapped_column(Integer, primary_key=True, autoincrement=True)
     id_remetente: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('usuarios.id'), nullable=False)
     id_destinatario: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('usuarios.id'), nullable=False)
-    status: so.Mapped[str] = so.mapped_column(Enum('enviado', 'lido', 'respondido'), nullable=False, default='enviado')
+    status: so.Mapped[str] = so.mapped_column(Enum('enviado', 'lido', 'respondido', 'expirado'), nullable=False, default='enviado')
     create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+    update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     data_resposta: so.Mapped[DateTime] = so.mapped_column(DateTime, nullable=True)
     tipo: so.Mapped[str] = so.mapped_column(Enum('msg', 'convite', 'news'), nullable=False)
     id_convite: so.Mapped[int] = so.mapped_column(Integer, ForeignKey('convites.id'), nullable=True)
@@ -243,6 +323,89 @@ class Mensagem(db.Model):
         except NoResultFound:
             return None
 
+    # Marca como lida só se ainda estiver como enviada
+    @classmethod
+    def marcar_lida(cls, id):
+        resultado = db.session.execute(
+            update(cls)
+            .where(cls.id == id, cls.status == 'enviado')
+            .values(status='lido')
+            .execution_options(synchronize_session=False)
+        )
+        return resultado.rowcount == 1
+
+    @classmethod
+    def status_atual(cls, id):
+        return db.session.execute(select(cls.status).where(cls.id == id)).scalar()
+
+
+class TokenRevogado(db.Model):
+    __tablename__ = 'token_revogado'
+    # Fica sempre no banco padrão, mesmo com sharding (ver sharding.py)
+    __global__ = True
+    jti: so.Mapped[str] = so.mapped_column(String(36), primary_key=True)
+    id_usuario: so.Mapped[int] = so.mapped_column(Integer, nullable=True)
+    expira: so.Mapped[DateTime] = so.mapped_column(DateTime, nullable=False, index=True)
+    create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class EmailFila(db.Model):
+    __tablename__ = 'email_fila'
+    id: so.Mapped[int] = so.mapped_column(Integer, primary_key=True, autoincrement=True)
+    destinatario: so.Mapped[str] = so.mapped_column(String(255), nullable=False)
+    assunto: so.Mapped[str] = so.mapped_column(String(255), nullable=False)
+    corpo: so.Mapped[str] = so.mapped_column(Text, nullable=False)
+    status: so.Mapped[str] = so.mapped_column(Enum('pendente', 'enviando', 'enviado', 'falhou'), nullable=False, default='pendente', index=True)
+    tentativas: so.Mapped[int] = so.mapped_column(Integer, nullable=False, default=0)
+    proxima_tentativa: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, index=True)
+    lote: so.Mapped[str] = so.mapped_column(String(32), nullable=True, index=True)
+    ultimo_erro: so.Mapped[str] = so.mapped_column(Text, nullable=True)
+    create_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow)
+    update_time: so.Mapped[DateTime] = so.mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Coloca um email na fila usando a mesma conexão (e transação) do insert
+# que disparou o evento; quem envia é o mail_worker
+def enfileirar_email(connection, destinatario, assunto, corpo):
+    connection.execute(
+        EmailFila.__table__.insert().values(destinatario=destinatario, assunto=assunto, corpo=corpo)
+    )
+
+
+# Transição de estado de um convite num único UPDATE condicional: só muda
+# se ainda estiver pendente, então duas respostas simultâneas não passam.
+# Condições e valores extras vão no mesmo UPDATE
+def responder_convite(modelo, convite_id, status, *condicoes, **valores):
+    resultado = db.session.execute(
+        update(modelo)
+        .where(modelo.id == convite_id, modelo.status == 'pendente', *condicoes)
+        .values(status=status, data_resposta=datetime.utcnow(), **valores)
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount == 1
+
+
+# Marca como respondidas as mensagens ligadas ao convite
+def responder_mensagens_convite(coluna_convite, convite_id):
+    db.session.execute(
+        update(Mensagem)
+        .where(Mensagem.id_convite.in_(select(Convite.id).where(coluna_convite == convite_id)))
+        .values(status='respondido', data_resposta=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+# INSERT ... SELECT que não falha se o vínculo já existir
+def insert_ignorando_duplicado(tabela, colunas, consulta):
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        coluna = tabela.c[colunas[0]]
+        return mysql_insert(tabela).from_select(colunas, consulta).on_duplicate_key_update({coluna.name: coluna})
+    # SQLite (desenvolvimento)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert(tabela).from_select(colunas, consulta).on_conflict_do_nothing()
+
 
 @event.listens_for(ConviteProfessor, 'after_insert')
 def create_convite_professor(mapper, connection, target):
@@ -279,6 +442,14 @@ def create_convite_professor(mapper, connection, target):
                         )
                     )
 
+            enfileirar_email(
+                connection,
+                target.email_professor,
+                'Convite para lecionar',
+                f'Você foi convidado para lecionar na unidade {unidade.nome}. '
+                'Acesse o Make Questions para aceitar ou recusar o convite.'
+            )
+
 @event.listens_for(ConviteAluno, 'after_insert')
 def create_convite_aluno(mapper, connection, target):
     # Inserindo no Convite
@@ -309,6 +480,14 @@ def create_convite_aluno(mapper, connection, target):
                     )
                 )
 
+            enfileirar_email(
+                connection,
+                target.email_aluno,
+                'Convite para turma',
+                f'Você foi convidado para a turma {turma.nome}. '
+                'Acesse o Make Questions para aceitar ou recusar o convite.'
+            )
+
 @event.listens_for(Usuario, 'after_insert')
 def create_professor_or_aluno(mapper, connection, target):
     if target.tipo == 'professor':
@@ -321,147 +500,10 @@ def create_professor_or_aluno(mapper, connection, target):
         )
 
 
-class UsuarioSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Usuario
-        include_fk = True
-        load_instance = True
-    senha = fields.String(load_only=True)
-    professor = Nested('ProfessorSchema', exclude=('usuario',), many=False)
-    aluno = Nested('AlunoSchema', exclude=('usuario',), many=False)
-    instituicao = Nested('InstituicaoSchema', exclude=('usuario',), many=False)
-    mensagens_enviadas = Nested('MensagemSchema', many=True, exclude=('remetente', ))
-    mensagens_recebidas = Nested('MensagemSchema', many=True, exclude=('destinatario', ))
-
-
-class ProfessorSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Professor
-        include_fk = True
-        load_instance = True
-    convites = Nested('ConviteSchema')
-    usuario = Nested(UsuarioSchema, exclude=('professor', 'mensagens_enviadas', 'mensagens_recebidas'))
-    unidades = Nested('ProfessorUnidadeSchema',many=True,exclude=('professor',))
-    
-
-
-class AlunoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Aluno
-        include_fk = True
-        load_instance = True
-
-    usuario = Nested(UsuarioSchema, exclude=('aluno', 'mensagens_enviadas', 'mensagens_recebidas'))
-
-
-class InstituicaoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Instituicao
-        include_fk = True
-        load_instance = True
-
-    usuario = Nested(UsuarioSchema, exclude=('instituicao', 'mensagens_enviadas', 'mensagens_recebidas'))
-    unidades = Nested('UnidadeSchema', many=True, exclude=('instituicao',))
-
-
-class CursoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Curso
-        include_fk = True
-        load_instance = True
-
-    unidade = Nested('UnidadeSchema', exclude=('cursos',))
-    professor = Nested(ProfessorSchema, exclude=('cursos',))
-
-
-class UnidadeSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Unidade
-        include_fk = True
-        load_instance = True
-    convites = Nested('ConviteProfessorSchema',many=True)
-    professores = Nested('ProfessorUnidadeSchema',many=True,exclude=('unidade',))
-    instituicao = Nested(InstituicaoSchema, exclude=('unidades',))
-    cursos = Nested(CursoSchema, many=True, exclude=('unidade',))
-    
-
-
-class TurmaSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Turma
-        include_fk = True
-        load_instance = True
-
-    professor = Nested(ProfessorSchema, exclude=('turmas',))
-    alunos = Nested('TurmaAlunoSchema', many=True, exclude=('turma',))
-
-
-class TurmaAlunoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = TurmaAluno
-        include_fk = True
-        load_instance = True
-
-    turma = Nested(TurmaSchema, exclude=('alunos',))
-    aluno = Nested(AlunoSchema, exclude=('turmas',))
-
-
-class TurmaCursoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = TurmaCurso
-        include_fk = True
-        load_instance = True
-
-    turma = Nested(TurmaSchema, exclude=('turmas_cursos',))
-    curso = Nested(CursoSchema, exclude=('turmas_cursos',))
-
-
-class ProfessorUnidadeSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = ProfessorUnidade
-        include_fk = True
-        load_instance = True
-
-    unidade = Nested(UnidadeSchema, exclude=('professores',) )
-    professor = Nested(ProfessorSchema, exclude=('unidades',))
-
-
-class ConviteProfessorSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = ConviteProfessor
-        include_fk = True
-        load_instance = True
-
-    unidade = Nested(UnidadeSchema, exclude=('convites',))
-    professor = Nested(ProfessorSchema, exclude=('convites',))
-
-
-class ConviteAlunoSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = ConviteAluno
-        include_fk = True
-        load_instance = True
-
-    turma = Nested(TurmaSchema, exclude=('convites_alunos',))
-    aluno = Nested(AlunoSchema, exclude=('convites',))
-
-
-class ConviteSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Convite
-        include_fk = True
-        load_instance = True
-
-    convite_professor = Nested(ConviteProfessorSchema, )
-    convite_aluno = Nested(ConviteAlunoSchema, )
-
-
-class MensagemSchema(SQLAlchemyAutoSchema):
-    class Meta:
-        model = Mensagem
-        include_fk = True
-        load_instance = True
-
-    remetente = Nested(UsuarioSchema, exclude=('mensagens_enviadas', 'mensagens_recebidas'))
-    destinatario = Nested(UsuarioSchema, exclude=('mensagens_recebidas', 'mensagens_enviadas'))
-    convite = Nested(ConviteSchema)
\ No newline at end of file
+# Os schemas ficam em schemas.py e só são carregados quando alguém pede,
+# assim importar os models não paga a introspecção do marshmallow
+def __getattr__(name):
+    if name.endswith('Schema'):
+        import schemas
+        return getattr(schemas, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
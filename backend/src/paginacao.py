@@ -0,0 +1,64 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, or_
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+
+def codificar_cursor(valores):
+    texto = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+# O cursor vem do cliente: cada valor tem que ter o tipo da sua coluna
+def decodificar_cursor(cursor, colunas):
+    texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    valores = json.loads(texto)
+    if not isinstance(valores, list) or len(valores) != len(colunas):
+        raise ValueError('Cursor inválido')
+
+    convertidos = []
+    for valor, coluna in zip(valores, colunas):
+        if isinstance(coluna.type, DateTime):
+            if not isinstance(valor, str):
+                raise ValueError('Cursor inválido')
+            valor = datetime.fromisoformat(valor)
+        elif type(valor) is not coluna.type.python_type:
+            raise ValueError('Cursor inválido')
+        convertidos.append(valor)
+    return convertidos
+
+
+# (a, b) > (x, y) escrito como a > x OR (a = x AND b > y), que o MySQL
+# consegue resolver pelo índice
+def depois_de(colunas, valores, desc):
+    condicoes = []
+    for i, coluna in enumerate(colunas):
+        iguais = [c == v for c, v in zip(colunas[:i], valores[:i])]
+        passo = coluna < valores[i] if desc else coluna > valores[i]
+        condicoes.append(and_(*iguais, passo))
+    return or_(*condicoes)
+
+
+# Aplica paginação por keyset numa consulta Core. `colunas` é a ordenação e
+# deve terminar numa coluna única (o id) para o cursor ser estável. Busca
+# uma linha a mais só para saber se existe próxima página
+def paginar(conexao, consulta, colunas, limite=None, cursor=None, desc=False):
+    limite = min(int(limite or LIMITE_PADRAO), LIMITE_MAXIMO)
+    if limite < 1:
+        raise ValueError('Limite inválido')
+
+    if cursor:
+        consulta = consulta.where(depois_de(colunas, decodificar_cursor(cursor, colunas), desc))
+    consulta = consulta.order_by(*[c.desc() if desc else c.asc() for c in colunas]).limit(limite + 1)
+
+    linhas = conexao.execute(consulta).all()
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]._mapping
+        proximo = codificar_cursor([ultima[c] for c in colunas])
+    return [dict(linha._mapping) for linha in linhas], proximo
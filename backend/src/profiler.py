@@ -0,0 +1,161 @@
+import hashlib
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import Response, current_app, g, jsonify, request
+
+# Profiler por amostragem para produção. Uma em cada PROFILE_SAMPLE_RATE
+# requisições (ou qualquer uma com o header de debug assinado) tem a pilha
+# da sua thread amostrada a cada PROFILE_INTERVAL segundos por uma thread
+# separada. As pilhas ficam agregadas por rota no formato "collapsed" do
+# flamegraph.pl / speedscope e saem em /debug/profile.
+
+HEADER_DEBUG = 'X-Debug-Profile'
+
+
+# Token do header: "<timestamp>.<hmac>" assinado com a SECRET_KEY
+def gerar_token_debug(secret, agora=None):
+    timestamp = str(int(agora or time.time()))
+    assinatura = hmac.new(secret.encode(), f'profile:{timestamp}'.encode(), hashlib.sha256).hexdigest()
+    return f'{timestamp}.{assinatura}'
+
+
+def token_debug_valido(token):
+    secret = current_app.config['SECRET_KEY']
+    if not token or not secret or '.' not in token:
+        return False
+    timestamp, _ = token.split('.', 1)
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > current_app.config['PROFILE_TOKEN_TTL']:
+        return False
+    return hmac.compare_digest(token, gerar_token_debug(secret, int(timestamp)))
+
+
+class Amostrador:
+    def __init__(self, intervalo, max_rotas, max_pilhas, max_profundidade):
+        self.intervalo = intervalo
+        self.max_rotas = max_rotas
+        self.max_pilhas = max_pilhas
+        self.max_profundidade = max_profundidade
+        self.ativos = {}  # id da thread -> rota
+        self.pilhas = {}  # rota -> Counter de pilhas
+        self.lock = threading.Lock()
+        self.tem_ativos = threading.Event()
+        self.thread = None
+
+    def iniciar(self, rota):
+        with self.lock:
+            self.ativos[threading.get_ident()] = rota
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='profiler', daemon=True)
+                self.thread.start()
+        self.tem_ativos.set()
+
+    def parar(self):
+        with self.lock:
+            self.ativos.pop(threading.get_ident(), None)
+            if not self.ativos:
+                self.tem_ativos.clear()
+
+    def _pilha(self, frame):
+        nomes = []
+        while frame is not None and len(nomes) < self.max_profundidade:
+            codigo = frame.f_code
+            nomes.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(nomes))
+
+    def _registrar(self, rota, pilha):
+        contador = self.pilhas.get(rota)
+        if contador is None:
+            if len(self.pilhas) >= self.max_rotas:
+                return
+            contador = self.pilhas[rota] = Counter()
+        if pilha not in contador and len(contador) >= self.max_pilhas:
+            pilha = '[outras pilhas]'
+        contador[pilha] += 1
+
+    def _loop(self):
+        while True:
+            self.tem_ativos.wait()
+            time.sleep(self.intervalo)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, rota in self.ativos.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self._registrar(rota, self._pilha(frame))
+
+    def collapsed(self, rota=None):
+        with self.lock:
+            linhas = []
+            for nome, contador in self.pilhas.items():
+                if rota and nome != rota:
+                    continue
+                for pilha, total in contador.most_common():
+                    linhas.append(f'{nome};{pilha} {total}')
+        return '\n'.join(linhas) + '\n'
+
+    def resumo(self):
+        with self.lock:
+            return {rota: sum(contador.values()) for rota, contador in self.pilhas.items()}
+
+    def limpar(self):
+        with self.lock:
+            self.pilhas.clear()
+
+
+def amostrador():
+    return current_app.extensions['profiler']
+
+
+def iniciar_amostragem():
+    config = current_app.config
+    forcado = request.headers.get(HEADER_DEBUG) and token_debug_valido(request.headers.get(HEADER_DEBUG))
+    taxa = config['PROFILE_SAMPLE_RATE']
+    if forcado or (taxa and random.random() < 1 / taxa):
+        rota = f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+        amostrador().iniciar(rota)
+        g.perfilando = True
+
+
+def parar_amostragem(exc):
+    if g.pop('perfilando', False):
+        amostrador().parar()
+
+
+def debug_profile():
+    if not token_debug_valido(request.headers.get(HEADER_DEBUG)):
+        return jsonify({"msg": "Não autorizado"}), 401
+
+    if request.method == 'DELETE':
+        amostrador().limpar()
+        return jsonify({"msg": "Amostras apagadas"}), 200
+    if request.args.get('formato') == 'json':
+        return jsonify({"amostras": amostrador().resumo()}), 200
+    return Response(amostrador().collapsed(request.args.get('rota')), mimetype='text/plain')
+
+
+@click.command('profile-token')
+def profile_token_command():
+    click.echo(gerar_token_debug(current_app.config['SECRET_KEY']))
+
+
+def init_profiler(app):
+    if not app.config['PROFILE_ENABLED']:
+        return
+    app.extensions['profiler'] = Amostrador(
+        app.config['PROFILE_INTERVAL'],
+        app.config['PROFILE_MAX_ROTAS'],
+        app.config['PROFILE_MAX_PILHAS'],
+        app.config['PROFILE_MAX_PROFUNDIDADE'],
+    )
+    app.before_request(iniciar_amostragem)
+    app.teardown_request(parar_amostragem)
+    app.add_url_rule('/debug/profile', 'debug_profile', debug_profile, methods=['GET', 'DELETE'])
+    app.cli.add_command(profile_token_command)
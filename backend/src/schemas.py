@@ -0,0 +1,150 @@
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from marshmallow_sqlalchemy.fields import Nested, fields
+from models import (Usuario, Professor, Aluno, Instituicao, Curso, Unidade, Turma, TurmaAluno, TurmaCurso,
+                    ProfessorUnidade, ConviteProfessor, ConviteAluno, Convite, Mensagem)
+
+
+class UsuarioSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Usuario
+        include_fk = True
+        load_instance = True
+    senha = fields.String(load_only=True)
+    professor = Nested('ProfessorSchema', exclude=('usuario',), many=False)
+    aluno = Nested('AlunoSchema', exclude=('usuario',), many=False)
+    instituicao = Nested('InstituicaoSchema', exclude=('usuario',), many=False)
+    mensagens_enviadas = Nested('MensagemSchema', many=True, exclude=('remetente', ))
+    mensagens_recebidas = Nested('MensagemSchema', many=True, exclude=('destinatario', ))
+
+
+class ProfessorSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Professor
+        include_fk = True
+        load_instance = True
+    convites = Nested('ConviteSchema')
+    usuario = Nested(UsuarioSchema, exclude=('professor', 'mensagens_enviadas', 'mensagens_recebidas'))
+    unidades = Nested('ProfessorUnidadeSchema',many=True,exclude=('professor',))
+    
+
+
+class AlunoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Aluno
+        include_fk = True
+        load_instance = True
+
+    usuario = Nested(UsuarioSchema, exclude=('aluno', 'mensagens_enviadas', 'mensagens_recebidas'))
+
+
+class InstituicaoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Instituicao
+        include_fk = True
+        load_instance = True
+
+    usuario = Nested(UsuarioSchema, exclude=('instituicao', 'mensagens_enviadas', 'mensagens_recebidas'))
+    unidades = Nested('UnidadeSchema', many=True, exclude=('instituicao',))
+
+
+class CursoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Curso
+        include_fk = True
+        load_instance = True
+
+    unidade = Nested('UnidadeSchema', exclude=('cursos',))
+    professor = Nested(ProfessorSchema)
+
+
+class UnidadeSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Unidade
+        include_fk = True
+        load_instance = True
+    convites = Nested('ConviteProfessorSchema',many=True)
+    professores = Nested('ProfessorUnidadeSchema',many=True,exclude=('unidade',))
+    instituicao = Nested(InstituicaoSchema, exclude=('unidades',))
+    cursos = Nested(CursoSchema, many=True, exclude=('unidade',))
+    
+
+
+class TurmaSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Turma
+        include_fk = True
+        load_instance = True
+
+    professor = Nested(ProfessorSchema)
+    alunos = Nested('TurmaAlunoSchema', many=True, exclude=('turma',))
+
+
+class TurmaAlunoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = TurmaAluno
+        include_fk = True
+        load_instance = True
+
+    turma = Nested(TurmaSchema, exclude=('alunos',))
+    aluno = Nested(AlunoSchema)
+
+
+class TurmaCursoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = TurmaCurso
+        include_fk = True
+        load_instance = True
+
+    turma = Nested(TurmaSchema)
+    curso = Nested(CursoSchema)
+
+
+class ProfessorUnidadeSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = ProfessorUnidade
+        include_fk = True
+        load_instance = True
+
+    unidade = Nested(UnidadeSchema, exclude=('professores',) )
+    professor = Nested(ProfessorSchema, exclude=('unidades',))
+
+
+class ConviteProfessorSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = ConviteProfessor
+        include_fk = True
+        load_instance = True
+
+    unidade = Nested(UnidadeSchema, exclude=('convites',))
+    professor = Nested(ProfessorSchema, exclude=('convites',))
+
+
+class ConviteAlunoSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = ConviteAluno
+        include_fk = True
+        load_instance = True
+
+    turma = Nested(TurmaSchema)
+    aluno = Nested(AlunoSchema)
+
+
+class ConviteSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Convite
+        include_fk = True
+        load_instance = True
+
+    convite_professor = Nested(ConviteProfessorSchema, )
+    convite_aluno = Nested(ConviteAlunoSchema, )
+
+
+class MensagemSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = Mensagem
+        include_fk = True
+        load_instance = True
+
+    remetente = Nested(UsuarioSchema, exclude=('mensagens_enviadas', 'mensagens_recebidas'))
+    destinatario = Nested(UsuarioSchema, exclude=('mensagens_recebidas', 'mensagens_enviadas'))
+    convite = Nested(ConviteSchema)
\ No newline at end of file
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, has_app_context, jsonify
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+
+# Sharding opcional por instituição.
+#
+# Cada shard é um banco com o schema completo, configurado em Config.SHARDS
+# (nome -> URI). Config.SHARD_MAP diz em qual shard fica cada instituição;
+# as que não estão no mapa ficam no banco padrão. Exemplo com SQLite:
+#
+#   SHARDS = {'shard_a': 'sqlite:///shard_a.db', 'shard_b': 'sqlite:///shard_b.db'}
+#   SHARD_MAP = {1: 'shard_a', 7: 'shard_b'}
+#
+# O id da instituição é reservado no diretório global instituicao_shard, para
+# ser único entre todos os bancos. Cada usuário vive em um único banco: quem
+# se cadastra fica no banco padrão e é levado para o shard da instituição
+# quando a cria ou quando é convidado por ela (trazer_usuario). Quem já tem
+# dados em outro banco não pode ser levado (UsuarioEmOutroShard).
+#
+# No login o usuário é procurado no banco padrão e em cada shard, e o shard
+# onde ele foi encontrado vai no token (claim 'shard'), junto com o email.
+# As requisições seguintes usam esse banco; os ids só são únicos dentro de
+# cada banco.
+
+
+class UsuarioEmOutroShard(Exception):
+    pass
+
+
+def sharding_ativo():
+    return bool(current_app.config['SHARDS'])
+
+
+# O banco padrão (None) e os shards, sempre na mesma ordem
+def bancos():
+    return [None] + sorted(current_app.config['SHARDS'])
+
+
+def shard_da_instituicao(id_instituicao):
+    return current_app.config['SHARD_MAP'].get(int(id_instituicao))
+
+
+# Session que escolhe o engine pelo shard da requisição atual (g.shard).
+# Models com __global__ = True ficam sempre no banco padrão
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        global_ = mapper is not None and getattr(mapper.class_, '__global__', False)
+        if bind is None and not global_ and has_app_context():
+            shard = g.get('shard')
+            if shard is not None:
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Claims do token: o shard da requisição atual, onde o usuário foi
+# encontrado (buscar_usuario_por_email) ou criado, e o email dele
+def claims_do_usuario(usuario):
+    if not sharding_ativo():
+        return {}
+    return {'shard': g.get('shard'), 'email': usuario.email}
+
+
+# Depois que um usuário muda de banco o id antigo pode ser reaproveitado por
+# outra pessoa; o email do token confirma que o id ainda é do mesmo usuário
+def token_do_usuario(usuario):
+    return not sharding_ativo() or get_jwt().get('email') == usuario.email
+
+
+# Antes de cada requisição: escolhe o shard pelo claim do JWT (se houver)
+def selecionar_shard():
+    if not sharding_ativo():
+        return
+    g.shard = None
+    try:
+        verify_jwt_in_request(optional=True)
+        claims = get_jwt()
+    except Exception:
+        # Token inválido: o @jwt_required da rota responde o erro
+        return
+    if not claims:
+        return
+
+    # Um token sem o claim (ou com um shard que não existe) não diz em qual
+    # banco está o usuário; cair no banco padrão entregaria o usuário de
+    # mesmo id de outro tenant
+    if 'shard' not in claims or (claims['shard'] is not None and claims['shard'] not in current_app.config['SHARDS']):
+        return jsonify({'msg': 'Token sem shard válido'}), 401
+    g.shard = claims['shard']
+
+
+# Procura o usuário no banco padrão e depois em cada shard; deixa g.shard
+# apontando para onde ele foi encontrado
+def buscar_usuario_por_email(email):
+    from models import Usuario
+
+    for shard in bancos():
+        g.shard = shard
+        usuario = Usuario.find_by_email(email)
+        if usuario:
+            return usuario
+    g.shard = None
+    return None
+
+
+# Reserva o id de uma nova instituição no diretório global e decide o shard
+# dela pelo SHARD_MAP
+def reservar_instituicao():
+    from models import db, InstituicaoShard
+
+    registro = InstituicaoShard()
+    db.session.add(registro)
+    db.session.flush()
+    registro.shard = shard_da_instituicao(registro.id)
+    return registro
+
+
+# Dados que prendem o usuário ao banco onde ele está
+def possui_vinculos(usuario):
+    if usuario.instituicao or usuario.mensagens_enviadas or usuario.mensagens_recebidas:
+        return True
+    professor = usuario.professor
+    if professor and (professor.turmas or professor.cursos or professor.unidade or professor.convites):
+        return True
+    aluno = usuario.aluno
+    return bool(aluno and (aluno.turmas or aluno.convites))
+
+
+# Garante que o usuário está no banco destino e retorna o registro de lá.
+# Só usuários ainda sem vínculos no banco padrão são movidos; a cópia e a
+# remoção vão no mesmo commit da requisição, mas não são atômicas entre os
+# dois bancos. O id muda, então o token antigo deixa de valer
+def trazer_usuario(usuario, origem, destino):
+    from models import db, Usuario, Professor, Aluno
+
+    if origem == destino:
+        g.shard = destino
+        return usuario
+
+    g.shard = origem
+    if origem is not None or possui_vinculos(usuario):
+        g.shard = destino
+        raise UsuarioEmOutroShard(usuario.email)
+
+    valores = {coluna.key: getattr(usuario, coluna.key) for coluna in Usuario.__table__.columns if coluna.key != 'id'}
+    matricula = usuario.aluno.matricula if usuario.aluno else None
+    carregados = [objeto for objeto in (usuario, usuario.professor, usuario.aluno) if objeto is not None]
+    db.session.execute(Professor.__table__.delete().where(Professor.id_usuario == usuario.id))
+    db.session.execute(Aluno.__table__.delete().where(Aluno.id_usuario == usuario.id))
+    db.session.execute(Usuario.__table__.delete().where(Usuario.id == usuario.id))
+    # Os ids se repetem entre os bancos: os objetos do banco de origem não
+    # podem ficar no identity map da session
+    for objeto in carregados:
+        db.session.expunge(objeto)
+
+    g.shard = destino
+    id_usuario = db.session.execute(Usuario.__table__.insert().values(**valores)).inserted_primary_key[0]
+    if valores['tipo'] == 'professor':
+        db.session.execute(Professor.__table__.insert().values(id_usuario=id_usuario))
+    elif valores['tipo'] == 'aluno':
+        db.session.execute(Aluno.__table__.insert().values(id_usuario=id_usuario, matricula=matricula))
+    return db.session.get(Usuario, id_usuario)
+
+
+# Procura o usuário em todos os bancos e o traz para o shard da requisição
+# atual (ex: professor convidado por uma instituição de outro shard)
+def trazer_usuario_por_email(email):
+    from models import Usuario
+
+    if not sharding_ativo():
+        return Usuario.find_by_email(email)
+
+    destino = g.get('shard')
+    usuario = buscar_usuario_por_email(email)
+    if usuario is None:
+        g.shard = destino
+        return None
+    return trazer_usuario(usuario, g.shard, destino)
+
+
+# Roda a mesma consulta no banco padrão e em todos os shards ao mesmo tempo,
+# cada uma na sua thread com seu próprio app context (e sua própria session)
+def fan_out(consulta):
+    from models import db
+
+    app = current_app._get_current_object()
+    shards = bancos()
+
+    def rodar(shard):
+        with app.app_context():
+            g.shard = shard
+            try:
+                return consulta()
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return list(executor.map(rodar, shards))
+
+
+# Junta os resultados do fan_out (na ordem de bancos()): as listas de cada
+# chave são concatenadas. Os ids se repetem entre os bancos, então cada item
+# ganha o campo 'shard' de onde veio (None = banco padrão)
+def mesclar(resultados):
+    mesclado = {}
+    for shard, resultado in zip(bancos(), resultados):
+        for chave, itens in resultado.items():
+            mesclado.setdefault(chave, []).extend({**item, 'shard': shard} for item in itens)
+    return mesclado
+
+
+def init_sharding(app):
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **app.config['SHARDS']}
+    app.before_request(selecionar_shard)